@@ -1,10 +1,92 @@
 import os
-import requests
+import sys
+import argparse
 from random import choice
-from html.parser import HTMLParser
 from datetime import datetime
 from time import sleep as slp
 import webbrowser
+from spoonacular_client import get_client, MAX_RANDOM_RECIPES
+from recipe_cache import RecipeCache
+from recipe_table import RecipeTable, table_filters
+from pantry_index import PantryIndex
+from seen_recipes import SeenRecipes, DEFAULT_PROFILE
+from near_duplicates import NearDuplicateIndex, collapse, dedupe_store
+from recipe_store import RecipeStore
+from requests import RequestException
+from spoonacular_errors import raise_for_status
+from circuit_breaker import CircuitBreaker
+from hedging import HedgePolicy
+from recipe_parser import missing_recipe_fields, use_instruction_cache
+from recipe_model import Recipe
+from intolerance_matcher import intolerance_bits
+from recipe_prefetcher import RecipePrefetcher
+from recipe_export import LOGO, make_fs_friendly, render_text, render_markdown, render_json, write_export
+
+API_KEY_ENV = "SPOONACULAR_API_KEY"  # Environment variable the non-interactive mode reads the API key from
+EXPORT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ReciPy")  # Where saved recipes go
+HEDGE_DETAIL_REQUESTS = False  # True sends a duplicate of any detail request slower than the recent p95. Each duplicate costs a quota point.
+RECIPE_BATCH_SIZE = 10  # Up to 100 (MAX_RANDOM_RECIPES). A batch costs one request, plus 0.01 quota points per recipe.
+
+intolerances_map = {"a": "grain",
+                    "e": "seafood",
+                    "f": "sulfite",
+                    "g": "gluten",
+                    "h": "shellfish",
+                    "m": "sesame",
+                    "p": "peanut",
+                    "s": "soy",
+                    "t": "tree-nut",
+                    "w": "wheat",
+                    }  # Map for shorthands
+
+
+def build_parameters(vegan, vegetarian, exclusions, number=RECIPE_BATCH_SIZE):  # Parameters for the Spoonacular API call
+    parameters = {
+        "number": number,  # Recipes per /random call; extras are buffered for "another recipe?"
+        "tags": f"",  # Empty string, to be populated from vegetarian/vegan requirement
+        "intolerances": ",".join(exclusions)  # Fed from prior user inputs
+    }
+    if vegan:
+        parameters["tags"] += "vegan"  # Add vegan to tag parameter
+    elif vegetarian:
+        parameters["tags"] += "vegetarian"  # Add vegetarian to tag parameter
+    return parameters
+
+
+def http_options():  # Resilience settings for the client find_recipe uses. An open circuit sends find_recipe to the offline collection.
+    return {"breaker": CircuitBreaker(), "hedge": HedgePolicy() if HEDGE_DETAIL_REQUESTS else None}
+
+
+def complete_recipe_batch(client, batch):  # Quietly fills in batch entries that lack a field we need, with one /informationBulk call for all of them.
+    missing_ids = [recipe_info["id"] for recipe_info in batch if missing_recipe_fields(recipe_info)]
+    if not missing_ids:
+        return batch
+    details = dict(zip(missing_ids, client.recipe_information_bulk(missing_ids)))
+    return [details.get(recipe_info["id"]) or recipe_info for recipe_info in batch]
+
+
+def suitable_recipes(batch, parameters):  # Recipes for a batch of payloads, minus any that trip one of the requested intolerances. Nothing is re-fetched.
+    forbidden = intolerance_bits(parameters.get("intolerances") or "")
+    recipes = (Recipe.from_payload(recipe_info) for recipe_info in batch)
+    return [recipe for recipe in recipes if recipe.allows(forbidden)]  # Spoonacular's intolerance filter lets some through.
+
+
+def already_seen(recipe_id, seen, duplicates):  # A known near-duplicate (RecipeStore.duplicates()) counts as seen once the recipe it copies has been.
+    return recipe_id in seen or duplicates.get(recipe_id, recipe_id) in seen
+
+
+def mark_seen(recipe, seen, duplicates):
+    seen.add(recipe.id)
+    seen.add(duplicates.get(recipe.id, recipe.id))  # So the original, and every other copy of it, is skipped too
+
+
+def unseen_payloads(batch, seen, duplicates):  # Drops payloads this profile has already been shown, before any detail request is spent on them.
+    return [recipe_info for recipe_info in batch if not already_seen(recipe_info["id"], seen, duplicates)]
+
+
+def offline_recipes(table, store, parameters, count, seen):  # Up to `count` random stored Recipes allowed by `parameters` and not in `seen`. No network access.
+    return [Recipe.from_payload(store.get(recipe_id)) for recipe_id in table.sample(count, seen, **table_filters(parameters))]
+
 
 def recipy():
 
@@ -13,18 +95,7 @@ def recipy():
 
     # <<< Start of class, function, and API construction definitions >>>
     def start_sequence():
-        global logo
-        logo = """
-        #######                      ##   #######           
-         ##   ##                           ##   ##          
-         ##   ##   #####    #####  ####    ##   ##  ##  ##  
-         ######   ##   ##  ##        ##    ######   ##  ##  
-         ## ##    #######  ##        ##    ##       ##  ##  
-         ##  ##   ##       ##        ##    ##        #####  
-         ##   ##   #####    #####  ######  ##           ##  
-                                                    ####  
-        """
-        print(logo+"\n") # Prints ASCII logo above
+        print(LOGO+"\n") # Prints ASCII logo
         slp(1)
         print("ReciPy - a simple Python program for providing recipes.\n")
         slp(2)
@@ -41,49 +112,6 @@ Press Ctrl+C to exit at any time."""
                 print(line)
                 slp(0.1)
 
-    class MyHTMLParser(HTMLParser):  # Subclass inherited from the imported HTMLParser
-        def __init__(self):
-            super().__init__()  # Make sure OG HTMLParser init gets executed.
-            self.instructions = []  # Empty list to store cleaned instructions.
-            self.recording = False  # Not recording anything yet during init.
-
-        def handle_starttag(self, tag, attrs):  # Attributes not yet in use but there just in case.
-            if tag == "li":  # Condition to check for tags starting with <li>.
-                self.recording = True  # Set recording flag to begin capturing data inside tag.
-                self.data = ""  # Create empty string for adding content from tag.
-
-        def handle_endtag(self, tag):
-            if tag == "li" and self.recording:  # Condition to check for tags ending </li> and if the parser is already capturing contents inside the <li>example</li>.
-                self.recording = False  # Stop recording at end of tag (</li>).
-                self.instructions.append(self.data.strip())  # Strip whitespace before/after content of each tag, then append to instructions list.
-
-        def handle_data(self, data):
-            if self.recording:  # Should only work when recording flag is enabled.
-                self.data += data  # Aggregate content inside <li></li>.
-
-    def clean_html_instructions(html_content):
-
-        def add_period(instruction):  # Inner function to add period to the instruction if not present.
-            instruction = instruction.strip()  # Removing any extra spaces from start and end.
-            endings = [".", "!", ".)", "!)", "...", ".."]
-            if not any(instruction.endswith(ending) for ending in endings):
-                instruction += "."  # Add a period if not already there.
-            return instruction
-
-        if any(tag in html_content for tag in ["<li>", "<ol>"]):  # The block inside this condition will execute if <li> or <ol> tags exist in the content.
-            parser = MyHTMLParser()  # Create an instance of the parser.
-            parser.feed(html_content)  # Feed the html content to the parser.
-            cleaned_instructions_list = [add_period(step) for step in parser.instructions]  # Construct list of cleaned instructions after adding period.
-            cleaned_instructions = "\n".join(f"{index}. {step}" for index, step in enumerate(cleaned_instructions_list, 1))  # Formatting the instructions.
-        else:
-            instructions_list = [add_period(instr) for instr in html_content.split(".") if instr.strip()]  # Split by periods and clean each instruction.
-            cleaned_instructions = "\n".join(f"{index}. {step}" for index, step in enumerate(instructions_list, 1))  # Joining the instructions to create a single string.
-
-        cleaned_instructions = cleaned_instructions.replace("<ol>", "").replace("</ol>", "").replace("<p>", "").replace("</p>", "").strip()  # Check and remove the <ol> and </ol> tags if they are present.
-
-        return cleaned_instructions
-
-
     def get_yes_no_input(prompt):  # Prompt the user for a yes or no input. Returns True for "y" and False for "n".
         
         while True:  # Keeps loop running until exit condition (return) is met.
@@ -93,40 +121,86 @@ Press Ctrl+C to exit at any time."""
             else:
                 print("Invalid input.\n")  # If input doesn't start with "y" or "n", keep asking the user until it does (within while True loop).
 
-    def find_recipe():  # Encapsulated program flow into function to make way for continuous loop
-        print("\nFetching recipe...\n")
-        slp(1)
-        response = requests.get(BASE_URL, headers=headers, params=parameters)  # API request
-
-        if response.status_code != 200:  # Code 200 indicates success. Anything else, we'll want to know.
-            print(f"\nError fetching random recipe: Code - {response.status_code}\n")  # Verbose
-            if response.status_code == 401:
-                slp(1)
-                global API_KEY
-                API_KEY = input("Not Authorised. Could you check your API key and re-enter it below?\n>>> ")
-                headers["x-api-key"] = API_KEY
-                print("\nRetrying", end="")
-                for i in range(3, 0, -1):
-                    print(".", end="", flush=True)
-                    slp(1)
-                print("\n\n")
-                response = requests.get(BASE_URL, headers=headers, params=parameters)
+    def keep_for_offline(batch):  # Persists every fetched payload in the local store, so offline mode (and later searches) have something to work with.
+        store.add_recipes(batch)
 
-        recipe_id = response.json()["recipes"][0]["id"]
+    def offline_recipe():  # One random local Recipe matching `parameters` (or None), for when the API can't be reached or is out of quota.
+        nonlocal offline
+        if offline is None:  # Only read the store's columns once they're actually needed; payloads are decoded one pick at a time.
+            offline = RecipeTable.from_store(store, distinct=True)
+        picked = offline_recipes(offline, store, parameters, 1, seen)
+        return picked[0] if picked else None
 
-        response = requests.get(DETAILED_RECIPE_URL.format(id=recipe_id), params={"apiKey": API_KEY})
+    def fetch_recipe_batch(params):  # Runs on the prefetcher's worker thread: one /random call for a whole batch, no printing or prompts.
+        response = raise_for_status(client.random_recipes(params))  # Errors are left for find_recipe to report (and fix, e.g. a bad key) in the foreground.
+        batch = response.json()["recipes"]
+        keep_for_offline(batch)
+        return collapse(suitable_recipes(complete_recipe_batch(client, unseen_payloads(batch, seen, duplicates)), params), served)
 
-        if response.status_code != 200:  # Code 200 indicates success. Anything else, we'll want to know.
-            print(f"\n\nError fetching detailed recipe: Code - {response.status_codye}")
-
-        recipe_info = response.json()
-        # Uncomment to debug
-        # print("--------------------\nDebug Output: Raw Instructions:", recipe_info.get("instructions"),"\n--------------------")
-
-        title, ingredients, instructions = extract_recipe_information(recipe_info)
+    def find_recipe():  # Encapsulated program flow into function to make way for continuous loop
+        print("\nFetching recipe...\n")
+        prefetcher.set_parameters(parameters)  # Throws away anything buffered for older preferences.
+        recipe = prefetcher.take()  # Left over from an earlier batch, or fetched in the background while the user was reading.
+        while recipe is not None and already_seen(recipe.id, seen, duplicates):  # Shown since it was buffered, e.g. from the offline collection.
+            recipe = prefetcher.take()
+        if recipe is None:  # Buffer is empty (e.g. the very first recipe), so fetch a batch here.
+            slp(1)
+            try:
+                response = client.random_recipes(parameters)  # API request over the shared keep-alive session
+            except RequestException:  # No connection at all
+                print("\nCould not reach Spoonacular.\n")
+                response = None
+
+            if response is not None and response.status_code != 200:  # Code 200 indicates success. Anything else, we'll want to know.
+                print(f"\nError fetching random recipe: Code - {response.status_code}\n")  # Verbose
+                if response.status_code == 401:
+                    slp(1)
+                    global API_KEY
+                    API_KEY = input("Not Authorised. Could you check your API key and re-enter it below?\n>>> ")
+                    client.set_api_key(API_KEY)
+                    print("\nRetrying", end="")
+                    for i in range(3, 0, -1):
+                        print(".", end="", flush=True)
+                        slp(1)
+                    print("\n\n")
+                    try:
+                        response = client.random_recipes(parameters)
+                    except RequestException:
+                        print("\nCould not reach Spoonacular.\n")
+                        response = None
+
+            if response is None or response.status_code != 200:  # API down or out of quota, so serve a recipe stored locally instead.
+                print("Serving a recipe from your offline collection.\n")
+                recipe = offline_recipe()  # Stored payloads are complete, so there's nothing left to fetch.
+                batch = []
+            else:
+                batch = response.json()["recipes"]  # /random already returns full recipe payloads, `number` of them.
+                keep_for_offline(batch)
+                batch = unseen_payloads(batch, seen, duplicates)  # Recipes the user has already been shown are skipped, details unfetched.
+                recipe = fetch_missing_details(batch[0]) if batch else None
+            try:
+                spare = suitable_recipes(complete_recipe_batch(client, batch[1:]), parameters)  # The rest of the batch serves later "another recipe?" answers.
+            except RequestException:  # Spares are a bonus; the prefetcher fetches more in the background.
+                spare = []
+            if recipe is not None and not recipe.allows(forbidden):  # Contains something the user can't eat, whatever Spoonacular says.
+                recipe = spare.pop(0) if spare else None
+            if recipe is not None:  # Near-copies within the batch, or of anything already served this session, are dropped.
+                kept = collapse([recipe] + spare, served)
+                recipe, spare = (kept[0], kept[1:]) if kept else (None, [])
+            if recipe is None:
+                print("\nNo recipes match your preferences right now. Please try again later.")
+                return
+
+            print("Extracting recipe information", end="")
+            for i in range(3, 0, -1):
+                print(".", end="", flush=True)
+                slp(1)
+            prefetcher.put(spare)
 
         print("\n")
-        display_recipe(title, ingredients, instructions)
+        display_recipe(recipe)
+        mark_seen(recipe, seen, duplicates)
+        seen.save()  # Straight away, so a later Ctrl+C or crash can't forget it
 
         if get_yes_no_input("\nWould you like to save this recipe as a text file?"):
             current_datetime = datetime.now().strftime("%d-%m-%y-%H%M%z")
@@ -134,73 +208,52 @@ Press Ctrl+C to exit at any time."""
             for i in range(3, 0, -1):
                 print(".", end="", flush=True)
                 slp(1)
-            fs_friendly_title = make_fs_friendly(title)
+            fs_friendly_title = make_fs_friendly(recipe.title)
             filename = f"{fs_friendly_title}-{current_datetime}.md"
-            save_to_file(filename, title, ingredients, instructions)
+            save_to_file(filename, recipe)
             print(f"\n\nRecipe saved to {filename}. Please see \"ReciPy\" folder.")
         slp(1)
         greeting = ["Bon appetit!", "Enjoy the meal!", "Happy cooking!", "*Chef's kiss*"]
         print("\n" + choice(greeting))
 
-    def extract_recipe_information(data):
-        print("Extracting recipe information", end="")
-        for i in range(3, 0, -1):
-            print(".", end="", flush=True)
-            slp(1)
-        title = data.get("title", "")  # Extracts title from recipe info.
-        ingredients = [ingredient.get("original", "") for ingredient in data.get("extendedIngredients", [])]  # Extracts extended ingredients from API response.
-        html_instructions = data.get("instructions", "")  # Extracts unparsed HTML-formatted instructions, will need further cleaning prior to output.
-        instructions = clean_html_instructions(html_instructions) # Call HTML cleaner function with raw HTML instructions as argument
-        return title, ingredients, instructions
-
-    def display_recipe(title, ingredients, instructions):  # Define function that displays recipes in user-friendly format, taking title, ingredients, and cleaned instructions as arguments.
-        print(f"Recipe: {title}\n")  # Prints recipe title
+    def fetch_missing_details(recipe_info):  # The Recipe for one /random payload.
+        if missing_recipe_fields(recipe_info):  # Only spend a second request if /random left out something we need.
+            recipe_id = recipe_info["id"]
+            try:
+                response = client.recipe_information(recipe_id)  # Transient failures are already retried inside the client.
+            except RequestException:
+                response = None
+
+            if response is None or response.status_code != 200:  # Code 200 indicates success. Anything else, we'll want to know.
+                print(f"\n\nError fetching detailed recipe: Code - {response.status_code if response is not None else 'no response'}")
+                print("Showing what we have of this recipe.\n")  # Partial recipe beats ending the session.
+            else:
+                recipe_info = response.json()
+        # Uncomment to debug
+        # print("--------------------\nDebug Output: Raw Instructions:", recipe_info.get("instructions"),"\n--------------------")
+        return Recipe.from_payload(recipe_info)
+
+    def display_recipe(recipe):  # Define function that displays recipes in user-friendly format, taking a Recipe (title, ingredients, cleaned instructions) as argument.
+        print(f"Recipe: {recipe.title}\n")  # Prints recipe title
         slp(1)
         print("Ingredients:")
         slp(0.5)                        # |
-        for ingredient in ingredients:  # |------> Prints list of ingredients
+        for ingredient in recipe.ingredient_lines():  # |------> Prints list of ingredients
             print(f"- {ingredient}")    # |
             slp(0.2)
         print("\nInstructions:")
         slp(0.5)
-        for instruction in instructions.split("\n"):
+        for instruction in recipe.instructions.split("\n"):
             print(instruction)
             slp(0.2)  
         slp(1.8)
-          
-    def make_fs_friendly(title):
-        unwanted_chars = ["<", ">", ":", "\"", "/", "\\", "|", "?", "*", " "]
-        for char in unwanted_chars:
-            title = title.replace(char, "-")
-        return title
-
-    def save_to_file(filename, title, ingredients, instructions):
-        directory_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ReciPy")
-        if not os.path.exists(directory_path):
-            os.makedirs(directory_path) 
-        
-        full_file_path = os.path.join(directory_path, filename)
-        fulldatetime = datetime.now().strftime("%a %d %b, %H:%M %z")
-        
-        with open(full_file_path, "w", encoding="utf-8") as file:
-            print("\n\nGenerating file", end="")
-            for i in range(3, 0, -1):
-                print(".", end="", flush=True)
-                slp(1)
-            file.write(f"\n```\n{logo}\n```\n\n# ReciPy Recipe Export\n\nGenerated on {fulldatetime}\n")
-            if vegan:
-                file.write("### Dietary Preference:\nVegan")
-            if vegetarian:
-                file.write("### Dietary Preference:\nVegetarian")
-            if len(exclusions) > 0:
-                file.write("\n\n### Exclusions & Intolerances: ")
-                for exclusion in exclusions:
-                    exclusion_cap = exclusion.capitalize()
-                    file.write(f"\n* {exclusion_cap}")
-            file.write(f"\n\n## Recipe: {title}\n\n### Ingredients:\n")
-            for ingredient in ingredients:
-                file.write(f"* {ingredient}\n")
-            file.write(f"\n### Instructions:\n{instructions}\n\nThanks for using **ReciPy**!\nData provided by [Spoonacular](www.spoonacular.com)")
+
+    def save_to_file(filename, recipe):
+        print("\n\nGenerating file", end="")
+        for i in range(3, 0, -1):
+            print(".", end="", flush=True)
+            slp(1)
+        write_export(EXPORT_DIRECTORY, filename, render_markdown(recipe, vegan, vegetarian, exclusions))
 
     def exit_sequence():
         input("\nPress [Enter] to exit\n>>> ")
@@ -237,18 +290,6 @@ Press Ctrl+C to exit at any time."""
     slp(2)
     intolerances_input = str(input("\nOr else, just hit [Enter] if you have no intolerances.\n>>> ")).lower()  # Requires user input
 
-    intolerances_map = {"a": "grain", 
-                        "e": "seafood", 
-                        "f": "sulfite", 
-                        "g": "gluten", 
-                        "h": "shellfish", 
-                        "m": "sesame", 
-                        "p": "peanut", 
-                        "s": "soy", 
-                        "t": "tree-nut", 
-                        "w": "wheat",       
-                        }  # Map for shorthands
-
     exclusions = []  # Create empty `exclusions` list
     already_in_exclusions = set()  # Initialise new set to guard against duplicates
 
@@ -262,48 +303,177 @@ Press Ctrl+C to exit at any time."""
     if not eggs_ok:
         exclusions.append("egg")  # Append "eggs" to exclusions list if answered "n" to eggs in beginning
 
-    exclusions_param = ",".join(exclusions)  # Set up the exclusion parameter for the API call
     # <<< End of User Preferences >>>
 
-    # print(exclusions_param)  # Uncomment for debug output
+    # print(exclusions)  # Uncomment for debug output
 
     # <<< Construct API call using parameters from above user preferences >>
     slp(1)
     global API_KEY
-    API_KEY = str(input("\nEnter your Spoonacular API key below.\n(Visit www.spoonacular.com/food-api to obtain a key.)\n>>> "))  # requests users to input their own Spoonacular API key
-    BASE_URL = "https://api.spoonacular.com/recipes/random" # base URL lifted from Spoonacular API guide
-    DETAILED_RECIPE_URL = "https://api.spoonacular.com/recipes/{id}/information"  # Recipe endpoint from Spoonacular API guide
+    API_KEY = str(input("\nEnter your Spoonacular API key below. Several keys, separated by commas, are used in turn.\n(Visit www.spoonacular.com/food-api to obtain a key.)\n>>> "))  # requests users to input their own Spoonacular API key
+    parameters = build_parameters(vegan, vegetarian, exclusions)
+    forbidden = intolerance_bits(exclusions)  # Checked locally too, on every recipe the API sends back
+
+    client = get_client(API_KEY, cache=RecipeCache(), **http_options())  # Shared session: one TLS handshake, then keep-alive for every later request. Recipe details are cached on disk.
+    prefetcher = RecipePrefetcher(fetch_recipe_batch, parameters)  # Buffers batches of ready recipes in memory
+    store = RecipeStore()  # SQLite copy of every recipe fetched so far
+    offline = None  # RecipeTable of the store, loaded the first time the API lets us down
+    seen = SeenRecipes()  # Recipes already shown, remembered across runs so random picks don't repeat
+    duplicates = store.duplicates()  # Near-copies found by the last `--dedupe` pass
+    served = NearDuplicateIndex()  # Signatures of every recipe served or buffered this session
+    # <<< End of API call construction >>>
 
-    parameters = {  # Parameters for the Spoonacular API call
-        "number": 1,  # for simplicity, 1 meal
-        "tags": f"",  # Empty string, to be populated from vegetarian/vegan requirement
-        "intolerances": exclusions_param  # Fed from prior user inputs
-    }
+    try:  # Ctrl+C lands anywhere in here; the worker thread, the store and the seen set are shut down either way.
+        while True:
+            find_recipe()
+            slp(1)
+            if not get_yes_no_input("\nWould you like to fetch another recipe?"):
+                slp(0.5)
+                if get_yes_no_input("\nWould you like to visit Spoonacular?"):
+                    webbrowser.open("https://www.spoonacular.com/")
+                slp(0.5)
+                break
+    finally:
+        prefetcher.close()
+        store.close()
+        seen.close()
+    exit_sequence()
 
-    if vegan:
-        parameters["tags"] += "vegan"  # Add vegan to tag parameter
-    elif vegetarian:
-        parameters["tags"] += "vegetarian"  # Add vegetarian to tag parameter
+# <<< Non-interactive mode: no prompts, no pauses. For cron jobs and other tools. >>>
+def parse_intolerances(text):  # Accepts the shorthand letters ("g w") or full names ("gluten,dairy"), comma or space separated.
+    known = set(intolerances_map.values()) | {"dairy", "egg"}
+    exclusions = []
+    for item in text.replace(",", " ").lower().split():
+        name = intolerances_map.get(item, item)
+        if name not in known:
+            raise argparse.ArgumentTypeError(f"unknown intolerance: {item}")
+        if name not in exclusions:
+            exclusions.append(name)
+    return exclusions
+
+
+def parse_pantry(text):  # "chicken, rice, garlic" -> ["chicken", "rice", "garlic"]
+    items = [item.strip() for item in text.split(",") if item.strip()]
+    if not items:
+        raise argparse.ArgumentTypeError("list at least one ingredient")
+    return items
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="ReciPy", description="Fetch random recipes from Spoonacular without any prompts or pauses. "
+                                                                "Run without arguments for the interactive version.")
+    parser.add_argument("--diet", choices=["any", "vegetarian", "vegan"], default="any")
+    parser.add_argument("--intolerances", type=parse_intolerances, default=[],
+                        help="e.g. \"gluten,dairy\" or the interactive shorthand \"g w\". Also accepts dairy and egg.")
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of recipes to fetch (default: 1)")
+    parser.add_argument("-f", "--format", choices=["text", "markdown", "json"], default="text", help="output format (default: text; json prints one recipe per line)")
+    parser.add_argument("-o", "--output-dir", help="save each recipe as a file in this directory instead of printing it")
+    parser.add_argument("--api-key-env", default=API_KEY_ENV, help=f"environment variable holding the API key, or several comma-separated keys (default: {API_KEY_ENV})")
+    parser.add_argument("--offline", action="store_true", help="serve recipes from the local store only, without touching the network")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help=f"whose already-seen recipes to skip (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--dedupe", action="store_true", help="find near-duplicate recipes in the local store, so later runs skip them, and exit")
+    parser.add_argument("--pantry", type=parse_pantry, help="comma-separated ingredients you have, e.g. \"chicken, rice, garlic\": picks the stored recipes "
+                                                             "that use the most of them (implies --offline)")
+    args = parser.parse_args(argv)
+    if args.count < 1:
+        parser.error("--count must be at least 1")
+    return args
+
+
+def fetch_recipes(client, store, parameters, count, seen):  # Up to `count` distinct random Recipes not yet in `seen`, in as few /random calls as possible.
+    recipes = []
+    duplicates = store.duplicates()
+    served = NearDuplicateIndex()
+    while len(recipes) < count:
+        batch_parameters = dict(parameters, number=min(count - len(recipes), MAX_RANDOM_RECIPES))
+        response = raise_for_status(client.random_recipes(batch_parameters))
+        batch = complete_recipe_batch(client, unseen_payloads(response.json()["recipes"], seen, duplicates))
+        if not batch:
+            break
+        store.add_recipes(batch)
+        accepted = collapse(suitable_recipes(batch, parameters), served)
+        if not accepted:  # The whole batch broke the exclusions (or copied earlier ones); asking again would most likely just spend more quota.
+            break
+        recipes.extend(accepted)
+    return recipes[:count]
+
+
+def pantry_recipes(store, pantry, vegan, vegetarian, exclusions, count, seen):  # Stored, unseen Recipes covering the most of `pantry`, best first. No network access.
+    table = RecipeTable.from_store(store)
+    duplicates = store.duplicates()
+    allowed = set(table.matching_ids(vegan=vegan or None, vegetarian=vegetarian or None, without_intolerances=exclusions or None))
+    allowed -= duplicates.keys()  # One copy of each recipe
+    index = PantryIndex.from_store(store)
+    limit = count
+    while True:  # Only the top of the ranking is checked against `seen`, widening it until enough unseen recipes turn up.
+        matches = index.best(pantry, limit=limit, allowed=allowed)
+        fresh = [recipe_id for recipe_id, coverage, covered, total in matches if not already_seen(recipe_id, seen, duplicates)]
+        if len(fresh) >= count or len(matches) < limit:
+            break
+        limit *= 4
+    return [Recipe.from_payload(store.get(recipe_id)) for recipe_id in fresh[:count]]
 
-    headers = {  # Headers for the API call
-        "Content-Type": "application/json",  # Default content type per Spoonacular API documentation
-        "x-api-key": API_KEY  # Fed into API call as a header
-    }
-    # <<< End of API call construction >>>
 
-    while True:
-        find_recipe()
-        slp(1)
-        if not get_yes_no_input("\nWould you like to fetch another recipe?"):
-            slp(0.5)
-            if get_yes_no_input("\nWould you like to visit Spoonacular?"):
-                webbrowser.open("https://www.spoonacular.com/")
-            slp(0.5)
-            break
+def main(argv=None):
+    args = parse_args(argv)
+    vegan = args.diet == "vegan"
+    vegetarian = args.diet == "vegetarian"
+    parameters = build_parameters(vegan, vegetarian, args.intolerances)
+
+    store = RecipeStore()
+    seen = SeenRecipes(args.profile)
+    try:
+        if args.dedupe:
+            duplicates = dedupe_store(store)
+            print(f"ReciPy: {len(duplicates)} of {len(store)} stored recipes are near-duplicates; they will be skipped from now on.")
+            return 0
+        if args.pantry:
+            recipes = pantry_recipes(store, args.pantry, vegan, vegetarian, args.intolerances, args.count, seen)
+        elif args.offline:
+            recipes = offline_recipes(RecipeTable.from_store(store, distinct=True), store, parameters, args.count, seen)
+        else:
+            api_key = os.environ.get(args.api_key_env)
+            if not api_key:
+                print(f"ReciPy: set {args.api_key_env} to your Spoonacular API key.", file=sys.stderr)
+                return 1
+            client = get_client(api_key, cache=RecipeCache(), **http_options())
+            try:
+                recipes = fetch_recipes(client, store, parameters, args.count, seen)
+            except RequestException as error:
+                print(f"ReciPy: could not fetch recipes: {error}", file=sys.stderr)
+                return 1
+        duplicates = store.duplicates()
+        for recipe in recipes:
+            mark_seen(recipe, seen, duplicates)
+    finally:
+        store.close()
+        seen.close()
+
+    if not recipes:
+        print("ReciPy: no recipes match these preferences.", file=sys.stderr)
+        return 1
+
+    for recipe in recipes:
+        if args.format == "json":
+            text, extension = render_json(recipe), "json"
+        elif args.format == "markdown":
+            text, extension = render_markdown(recipe, vegan, vegetarian, args.intolerances), "md"
+        else:
+            text, extension = render_text(recipe), "txt"
+        if args.output_dir:
+            print(write_export(args.output_dir, f"{make_fs_friendly(recipe.title)}-{recipe.id}.{extension}", text))
+        else:
+            print(text)
+    return 0
 
-    exit_sequence()
 
 if __name__ == "__main__":
+    instruction_cache = use_instruction_cache()  # Cleaned instructions persist in .recipy, so repeat recipes skip the HTML cleaner next run too.
+    if len(sys.argv) > 1:  # Any arguments at all means non-interactive mode.
+        try:
+            sys.exit(main())
+        finally:
+            instruction_cache.close()
     try:
         recipy()
     except KeyboardInterrupt:
@@ -314,4 +484,6 @@ if __name__ == "__main__":
             print(".", end="", flush=True)
             slp(1)
         print("\n\nExit Code [2]\n")
-        slp(0.5)
\ No newline at end of file
+        slp(0.5)
+    finally:
+        instruction_cache.close()
\ No newline at end of file
@@ -0,0 +1,124 @@
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from spoonacular_errors import NoApiKeyAvailable
+
+DEFAULT_KEY_RATE = 1.0  # Requests per second per key. Spoonacular's free plan allows 60 a minute.
+DEFAULT_KEY_BURST = 5  # Requests a rested key may send back to back.
+ESTIMATED_POINTS = 1.0  # Quota points charged to a key per request until the response headers say otherwise.
+QUOTA_USED_HEADER = "X-API-Quota-Used"
+QUOTA_LEFT_HEADER = "X-API-Quota-Left"
+
+
+def parse_api_keys(text):  # "key1, key2 key3" -> ["key1", "key2", "key3"], duplicates dropped.
+    return list(dict.fromkeys(text.replace(",", " ").split()))
+
+
+def next_quota_reset(now=None):  # Spoonacular quotas reset at midnight UTC.
+    now = datetime.fromtimestamp(now if now is not None else time.time(), timezone.utc)
+    return (now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp()
+
+
+class TokenBucket:  # `rate` tokens a second, holding at most `capacity`. The balance may go negative: that is the caller's wait.
+    def __init__(self, rate=DEFAULT_KEY_RATE, capacity=DEFAULT_KEY_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):  # Takes one token; returns the seconds to wait before using it.
+        self.refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+class ApiKeyState:
+    def __init__(self, key, rate, burst):
+        self.key = key
+        self.bucket = TokenBucket(rate, burst)
+        self.quota_left = None  # Unknown until a response carries X-API-Quota-Left.
+        self.quota_used = None
+        self.in_flight = 0
+        self.exhausted_until = 0.0  # Epoch seconds; out of rotation until then.
+        self.invalid = False  # Rejected with 401. Never used again.
+
+    def headroom(self):  # Quota points we expect the key still has, net of requests awaiting their headers.
+        if self.quota_left is None:
+            return float("inf")  # Try unknown keys first; their first response tells us where they stand.
+        return self.quota_left - self.in_flight * ESTIMATED_POINTS
+
+
+class ApiKeyPool:  # Routes each request to the key with the most quota headroom, within that key's token bucket.
+    def __init__(self, keys, rate=DEFAULT_KEY_RATE, burst=DEFAULT_KEY_BURST):
+        keys = parse_api_keys(keys) if isinstance(keys, str) else list(dict.fromkeys(keys))
+        if not keys:
+            raise ValueError("ApiKeyPool needs at least one key")
+        self.states = {key: ApiKeyState(key, rate, burst) for key in keys}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.states)
+
+    def available(self, now=None):  # Keys currently in rotation.
+        now = time.time() if now is None else now
+        return [state for state in self.states.values() if not state.invalid and state.exhausted_until <= now]
+
+    def reserve(self):  # Returns (key, seconds to wait before sending). Raises NoApiKeyAvailable.
+        with self._lock:
+            now = time.monotonic()
+            candidates = self.available()
+            if not candidates:
+                raise NoApiKeyAvailable("Every Spoonacular API key is invalid or out of daily quota.")
+            for state in candidates:
+                state.bucket.refill(now)
+                if state.exhausted_until:  # Back after the daily reset: forget the stale counts.
+                    state.exhausted_until = 0.0
+                    state.quota_left = state.quota_used = None
+            # A key that can send right away beats one that can't; among those, the most quota left wins.
+            state = max(candidates, key=lambda state: (state.bucket.tokens >= 1, state.headroom(), state.bucket.tokens))
+            state.in_flight += 1
+            return state.key, state.bucket.take(now)
+
+    def record(self, key, response=None):  # Call once per reserve(), with the response (None if the request failed).
+        with self._lock:
+            state = self.states.get(key)
+            if state is None:
+                return
+            state.in_flight = max(state.in_flight - 1, 0)
+            if response is None:
+                return
+            left = response.headers.get(QUOTA_LEFT_HEADER)
+            used = response.headers.get(QUOTA_USED_HEADER)
+            try:
+                if left is not None:
+                    state.quota_left = float(left)
+                if used is not None:
+                    state.quota_used = float(used)
+            except ValueError:
+                pass
+            if response.status_code == 401:
+                state.invalid = True
+            elif response.status_code == 402 or (state.quota_left is not None and state.quota_left <= 0):
+                state.exhausted_until = next_quota_reset()
+
+    def quota_by_key(self, reserve=0.0):  # Points each key in rotation has left, keeping `reserve` back. None for keys not heard from yet.
+        with self._lock:
+            headroom = [state.headroom() for state in self.available()]
+        return [None if points == float("inf") else max(points - reserve, 0.0) for points in headroom]
+
+    def stats(self):  # Per-key view with the keys shortened, safe to log.
+        now = time.time()
+        return [
+            {
+                "key": f"{state.key[:4]}...",
+                "quota_used": state.quota_used,
+                "quota_left": state.quota_left,
+                "in_flight": state.in_flight,
+                "status": "invalid" if state.invalid else "exhausted" if state.exhausted_until > now else "active",
+            }
+            for state in self.states.values()
+        ]
@@ -0,0 +1,117 @@
+import sys
+import time
+import random
+import argparse
+from html.parser import HTMLParser
+from recipe_parser import clean_html_instructions
+from spoonacular_stub import make_recipe
+
+# <<< Fixture corpus and micro-benchmark for recipe_parser.clean_html_instructions >>>
+# The single-pass cleaner must give exactly what the old MyHTMLParser + str.replace chain gave, so that chain is kept here as
+# the reference. `python benchmark_instructions.py` checks every fixture against it, then times both; it exits 1 on any difference.
+
+FIXTURES = [  # Hand-written edge cases
+    "", "Mix everything", "Mix everything.", "Preheat oven to 350. Bake 1.5 hours! Serve (warm.)", "Wow!!", "Done...", "Stir (gently).",
+    "<ol><li>Mix the things</li><li>Bake at 1.5 degrees!</li></ol>", "<ol>\n  <li>  Chop onions  </li>\n<li>Fry.</li>\n</ol>",
+    "<p>Mix the flour.</p><p>Bake</p>", "<ol><li><span>Whisk</span> eggs &amp; milk</li><li>Cook 2&ndash;3 min</li></ol>",
+    "<ol><li>Stir <b>well</b> then <i>rest</i></li><li>Serve &quot;hot&quot;</li></ol>", "<ol><li class=\"step\">Boil water</li><li class='x>y'>Add pasta</li></ol>",
+    "<OL><LI>Upper</LI></OL>", "<ol><li>Open<li>Nested</li> tail</li></ol>", "<ol><li>Unclosed", "<ol></ol>", "<ol><li></li><li> </li></ol>",
+    "<ol><li>a &lt;p&gt; b</li><li>&lt;ol&gt;x&lt;/ol&gt;</li></ol>", "<ol><!-- <li>hidden</li> --><li>shown</li></ol>", "<ol><li>a < b and c > d</li></ol>",
+    "<ol><li>line<br/>break</li><li>tab\there</li></ol>", "Instructions<ol><li>One</li></ol>", "<li>No ol</li><li>Two!)</li>", "<ol><li>x</li>",
+    "<p>Preheat oven. <b>Mix</b></p>", "Step one.<br>Step two", "<ol><li>caf&eacute; &#233; &#xe9; &amp</li></ol>", "<ol><li>Ends with )</li><li>Ends with .)</li></ol>",
+    "<div><ol><li>Mix</li></ol></div><p>Enjoy</p>", "<ol><li>a</li ><li>b</ li></ol>", "<ol><li><p>Wrapped</p></li></ol>", "<ol><li>x</li></ol><li>y</li>",
+    "<ol><li/>x</ol>", "<ol><li>a<li/>b</li></ol>", "<ol><li class=x/>b</li></ol>", "<ol><li a=\"x=y\"/>b</li></ol>", "<ol><li x=/>b</li></ol>",
+    "<ol><li>a<script>x<li>y</li>&amp;</script>z</li></ol>", "<ol><li>a<style>q</li></style>z</li></ol>", "<ol><li>a<SCRIPT>x</li></ScRiPt>b</li></ol>",
+    "<ol><li>a<script>never closed</li></ol>", "<ol><li>a<script/>b</li></ol>", "<ol><li>a</>b</li></ol>", "<ol><li>a</ >b</li></ol>", "<ol><li>a</1>b</li></ol>",
+    "<ol><li>a</li/>b</ol>", "<ol><li>a</li x>b</ol>", "<ol><li>a<!-- x -- >b</li></ol>",
+]
+FRAGMENTS = [  # Random mixes of these make up the rest of the corpus
+    "<ol>", "</ol>", "<li>", "</li>", "<p>", "</p>", "<b>", "</b>", "<br/>", "Mix", " the ", "eggs", ".", "!", ")", "(", "&amp;", "&lt;", "&gt;", "&", "1.5",
+    "\n", "  ", "<LI>", "</LI>", "<li class='a'>", "<!-- c -->", "<", ">", "x", ";", "<span>", "</span>", "&#233;", "'", '"', "</ li>", '<li x="a>b">',
+    "<ol class=x>", "</ol >", "<?pi?>", "<!DOCTYPE x>", "\t", "<li/>", "<li />", "<li a=b/>", "/", "</>", "</ >", "<script>", "</script>", "<style>",
+    "</STYLE>", "<script/>", "--", "<!--",
+]
+
+
+class MyHTMLParser(HTMLParser):  # The previous cleaner, as it was.
+    def __init__(self):
+        super().__init__()
+        self.instructions = []
+        self.recording = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "li":
+            self.recording = True
+            self.data = ""
+
+    def handle_endtag(self, tag):
+        if tag == "li" and self.recording:
+            self.recording = False
+            self.instructions.append(self.data.strip())
+
+    def handle_data(self, data):
+        if self.recording:
+            self.data += data
+
+
+def reference_clean_html_instructions(html_content):
+    def add_period(instruction):
+        instruction = instruction.strip()
+        endings = [".", "!", ".)", "!)", "...", ".."]
+        if not any(instruction.endswith(ending) for ending in endings):
+            instruction += "."
+        return instruction
+
+    if any(tag in html_content for tag in ["<li>", "<ol>"]):
+        parser = MyHTMLParser()
+        parser.feed(html_content)
+        cleaned_instructions_list = [add_period(step) for step in parser.instructions]
+        cleaned_instructions = "\n".join(f"{index}. {step}" for index, step in enumerate(cleaned_instructions_list, 1))
+    else:
+        instructions_list = [add_period(instr) for instr in html_content.split(".") if instr.strip()]
+        cleaned_instructions = "\n".join(f"{index}. {step}" for index, step in enumerate(instructions_list, 1))
+    return cleaned_instructions.replace("<ol>", "").replace("</ol>", "").replace("<p>", "").replace("</p>", "").strip()
+
+
+def recipe_inputs(count):  # Instructions as the stub (and Spoonacular) send them.
+    return [make_recipe(recipe_id)["instructions"] for recipe_id in range(1, count + 1)]
+
+
+def fuzz_inputs(count, seed=0):
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(1, 25))) for _ in range(count)]
+
+
+def per_input(cleaner, inputs, repeat):  # Best of `repeat` runs, in microseconds per input.
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html_content in inputs:
+            cleaner(html_content)
+        best = min(best, time.perf_counter() - start)
+    return best / len(inputs) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check clean_html_instructions against the old html.parser chain, then time both.")
+    parser.add_argument("--recipes", type=int, default=1000, help="generated recipe instructions (default: 1000)")
+    parser.add_argument("--fuzz", type=int, default=60000, help="random fragment mixes (default: 60000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per corpus; the best one counts (default: 5)")
+    args = parser.parse_args(argv)
+
+    corpora = {"recipes": recipe_inputs(args.recipes), "fuzz": FIXTURES + fuzz_inputs(args.fuzz, args.seed)}
+    different = [html_content for inputs in corpora.values() for html_content in inputs
+                 if clean_html_instructions(html_content) != reference_clean_html_instructions(html_content)]
+    print(f"{sum(map(len, corpora.values()))} inputs, {len(different)} different")
+    for html_content in different[:10]:
+        print(f"  {html_content!r}\n    old: {reference_clean_html_instructions(html_content)!r}\n    new: {clean_html_instructions(html_content)!r}")
+    for name, inputs in corpora.items():
+        old = per_input(reference_clean_html_instructions, inputs, args.repeat)
+        new = per_input(clean_html_instructions, inputs, args.repeat)
+        print(f"{name}: {old:.1f}us -> {new:.1f}us per input ({old / new:.1f}x)")
+    return 1 if different else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
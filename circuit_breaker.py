@@ -0,0 +1,59 @@
+import time
+import threading
+from spoonacular_errors import SpoonacularError
+
+DEFAULT_FAILURE_THRESHOLD = 5  # Consecutive failed attempts that open the circuit.
+DEFAULT_RESET_TIMEOUT = 30.0  # Seconds the circuit stays open before one probe request is let through.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(SpoonacularError):  # Refused without touching the network; Spoonacular looked unhealthy moments ago.
+    pass
+
+
+class CircuitBreaker:  # Stops calling an upstream that keeps failing, so callers fall back to the cache or offline recipes right away.
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0  # Consecutive, reset by any success
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False  # A half-open probe is in flight; everyone else is still refused.
+        self._lock = threading.Lock()
+
+    def allow(self):  # True if a request may go out now.
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):  # The allowed request ended without telling us anything about upstream health (e.g. a cache hit).
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
@@ -0,0 +1,44 @@
+import math
+import threading
+from collections import deque
+
+DEFAULT_PERCENTILE = 0.95  # Hedge once the first request is slower than this share of recent ones.
+DEFAULT_WINDOW = 256  # Recent latencies kept
+DEFAULT_MIN_SAMPLES = 20  # Below this, `initial_delay` is used instead of a percentile.
+DEFAULT_INITIAL_DELAY = 1.0  # Seconds
+HEDGED_ENDPOINTS = ("information",)  # TIMEOUTS names. Only cheap, idempotent calls: every duplicate costs a quota point.
+
+
+class HedgePolicy:  # When a request is slower than the recent p95, send a duplicate and keep whichever answer arrives first.
+    def __init__(self, percentile=DEFAULT_PERCENTILE, window=DEFAULT_WINDOW, min_samples=DEFAULT_MIN_SAMPLES,
+                 initial_delay=DEFAULT_INITIAL_DELAY, endpoints=HEDGED_ENDPOINTS):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.endpoints = set(endpoints)
+        self.samples = deque(maxlen=window)  # Seconds, oldest first
+        self.hedges_sent = 0
+        self.hedges_won = 0  # Times the duplicate answered first
+        self._lock = threading.Lock()
+
+    def applies_to(self, endpoint):
+        return endpoint in self.endpoints
+
+    def observe(self, seconds):  # Latency of one completed upstream request (cache hits excluded).
+        with self._lock:
+            self.samples.append(seconds)
+
+    def delay(self):  # Seconds to wait for the first request before hedging.
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)]
+
+    def record_hedge(self, won):
+        with self._lock:
+            self.hedges_sent += 1
+            self.hedges_won += bool(won)
+
+    def stats(self):
+        return {"delay": self.delay(), "samples": len(self.samples), "hedges_sent": self.hedges_sent, "hedges_won": self.hedges_won}
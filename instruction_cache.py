@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 4096  # Cleaned instructions kept in memory
+DEFAULT_MAX_DISK_ENTRIES = 100_000
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recipy", "instructions.db")
+FLUSH_EVERY = 64  # New results buffered before one disk transaction. Each one is cheap to redo, so losing a buffer to a crash is fine.
+CLEANER_VERSION = b"3"  # Part of every key. Bump it when the cleaner's output changes, so stale disk entries stop matching.
+
+DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cleaned (
+    key BLOB PRIMARY KEY,
+    instructions TEXT NOT NULL,
+    used_at INTEGER NOT NULL  -- Counter at the row's last insert or disk hit; rows unused for max_disk_entries of those are trimmed
+)
+"""
+
+
+def content_key(html):  # 16-byte digest of the raw instructions.
+    return hashlib.blake2b(html.encode("utf-8"), digest_size=16, person=CLEANER_VERSION.ljust(16, b"\0")).digest()
+
+
+class InstructionCache:  # Memoizes clean(html) by content hash: an LRU dict in memory, optionally backed by SQLite across runs.
+    def __init__(self, clean, max_entries=DEFAULT_MAX_ENTRIES, path=None, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.clean_function = clean
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> cleaned text, least recently used first
+        self._pending = []  # (key, text) not yet written to disk
+        self._touched = []  # Keys hit on disk since the last flush, whose used_at is due a bump
+        self._lock = threading.Lock()  # The prefetcher's worker thread cleans instructions too.
+        self.connection = None
+        if path is not None:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            with self.connection:
+                self.connection.execute(DISK_SCHEMA)
+            self._counter = self.connection.execute("SELECT COALESCE(MAX(used_at), 0) FROM cleaned").fetchone()[0]
+
+    def clean(self, html):  # Same result as clean(html), parsed at most once per distinct input.
+        if not html:
+            return self.clean_function(html)
+        key = content_key(html)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            if self.connection is not None:
+                row = self.connection.execute("SELECT instructions FROM cleaned WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._remember(key, row[0])
+                    self._touched.append(key)
+                    if len(self._pending) + len(self._touched) >= FLUSH_EVERY:
+                        self._flush()
+                    return row[0]
+            self.misses += 1
+        text = self.clean_function(html)  # Outside the lock: parsing is the slow part.
+        with self._lock:
+            self._remember(key, text)
+            if self.connection is not None:
+                self._pending.append((key, text))
+                if len(self._pending) + len(self._touched) >= FLUSH_EVERY:
+                    self._flush()
+        return text
+
+    def _remember(self, key, text):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _flush(self):  # Caller holds the lock.
+        if not self._pending and not self._touched:
+            return
+        rows = []
+        for key, text in self._pending:
+            self._counter += 1
+            rows.append((key, text, self._counter))
+        touched = []
+        for key in self._touched:
+            self._counter += 1
+            touched.append((self._counter, key))
+        self._pending = []
+        self._touched = []
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO cleaned (key, instructions, used_at) VALUES (?, ?, ?)", rows)
+            self.connection.executemany("UPDATE cleaned SET used_at = ? WHERE key = ?", touched)
+            oldest_kept = self._counter - self.max_disk_entries
+            if oldest_kept > 0:
+                self.connection.execute("DELETE FROM cleaned WHERE used_at <= ?", (oldest_kept,))
+
+    def flush(self):
+        with self._lock:
+            if self.connection is not None:
+                self._flush()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def close(self):
+        with self._lock:
+            if self.connection is not None:
+                self._flush()
+                self.connection.close()
+                self.connection = None
@@ -0,0 +1,107 @@
+import re
+
+# <<< Local intolerance checks: every ingredient id is classified once, every recipe becomes one bitmask >>>
+# Spoonacular's own filtering (and its glutenFree/dairyFree flags) is often wrong, so recipes are checked against what they
+# actually contain. A recipe trips an intolerance if any ingredient matches it or if the payload flags it; either is enough.
+INTOLERANCE_KEYWORDS = {
+    "dairy": ["milk", "cheese", "butter", "cream", "yogurt", "yoghurt", "ghee", "whey", "casein", "buttermilk", "parmesan", "mozzarella", "ricotta"],
+    "egg": ["egg", "eggs", "egg white", "egg whites", "egg yolk", "egg yolks", "mayonnaise", "meringue"],
+    "grain": ["grain", "rice", "oat", "oats", "wheat", "barley", "rye", "corn", "cornmeal", "quinoa", "millet", "flour", "bread", "pasta", "couscous", "bulgur", "cereal", "noodles"],
+    "seafood": ["fish", "salmon", "tuna", "cod", "anchovy", "anchovies", "sardine", "sardines", "trout", "halibut", "tilapia", "mackerel", "haddock", "seafood",
+                "shrimp", "prawn", "prawns", "crab", "lobster", "clam", "clams", "mussel", "mussels", "oyster", "oysters", "scallop", "scallops", "squid", "octopus"],
+    "sulfite": ["wine", "vinegar", "dried apricots", "raisins", "molasses", "sulfite", "sulphite"],
+    "gluten": ["wheat", "flour", "bread", "breadcrumbs", "pasta", "spaghetti", "barley", "rye", "couscous", "semolina", "seitan", "bulgur"],
+    "shellfish": ["shrimp", "prawn", "prawns", "crab", "lobster", "clam", "clams", "mussel", "mussels", "oyster", "oysters", "scallop", "scallops", "crawfish", "shellfish"],
+    "sesame": ["sesame", "tahini"],
+    "peanut": ["peanut", "peanuts", "peanut butter"],
+    "soy": ["soy", "soya", "tofu", "edamame", "tempeh", "miso", "tamari", "soy sauce"],
+    "tree-nut": ["almond", "almonds", "walnut", "walnuts", "pecan", "pecans", "cashew", "cashews", "hazelnut", "hazelnuts", "pistachio", "pistachios",
+                 "macadamia", "brazil nut", "pine nuts", "nut", "nuts"],
+    "wheat": ["wheat", "flour", "bread", "breadcrumbs", "pasta", "spaghetti", "couscous", "semolina", "bulgur", "seitan", "noodles"],
+}
+INTOLERANCE_PATTERNS = {  # Whole-word matches, so "egg" doesn't catch "eggplant".
+    intolerance: re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b")
+    for intolerance, words in INTOLERANCE_KEYWORDS.items()
+}
+INTOLERANCE_BITS = {intolerance: 1 << bit for bit, intolerance in enumerate(INTOLERANCE_KEYWORDS)}
+AISLE_INTOLERANCES = {"seafood": "seafood", "cheese": "dairy"}  # Spoonacular aisles (lowercased) that settle the question by themselves
+NOT_DAIRY = re.compile(  # Dairy words in plant-based names: "peanut butter", "almond milk", "coconut cream", "cream of tartar"
+    r"\b(?:peanut|almond|cashew|nut|seed|sunflower|apple|cocoa|cacao|shea|coconut|soy|oat|rice|hemp)\s+(?:butter|milk|cream)\b|\bcream of tartar\b"
+)
+FREE_FROM = re.compile(r"\b(dairy|egg|gluten|soy|nut|peanut)[- ]free\b")  # "gluten-free flour" is not gluten
+FREE_FROM_BITS = {
+    "dairy": INTOLERANCE_BITS["dairy"],
+    "egg": INTOLERANCE_BITS["egg"],
+    "gluten": INTOLERANCE_BITS["gluten"] | INTOLERANCE_BITS["wheat"],
+    "soy": INTOLERANCE_BITS["soy"],
+    "nut": INTOLERANCE_BITS["tree-nut"] | INTOLERANCE_BITS["peanut"],
+    "peanut": INTOLERANCE_BITS["peanut"],
+}
+
+
+def intolerance_bits(exclusions):  # Intolerance names (a list, or the API's comma-separated string) -> bitmask. Unknown names are ignored.
+    if isinstance(exclusions, str):
+        exclusions = exclusions.split(",")
+    mask = 0
+    for exclusion in exclusions:
+        mask |= INTOLERANCE_BITS.get(exclusion.strip(), 0)
+    return mask
+
+
+def name_mask(text):  # Intolerances a lowercased ingredient name trips.
+    mask = 0
+    for intolerance, pattern in INTOLERANCE_PATTERNS.items():
+        if pattern.search(NOT_DAIRY.sub(" ", text) if intolerance == "dairy" else text):
+            mask |= INTOLERANCE_BITS[intolerance]
+    for free in FREE_FROM.findall(text):
+        mask &= ~FREE_FROM_BITS[free]
+    return mask
+
+
+class IntoleranceMatcher:
+    def __init__(self):
+        self.ingredient_masks = {}  # Spoonacular ingredient id -> bitmask, filled as ingredients are first seen
+
+    def ingredient_mask(self, ingredient_id, name, name_clean="", aisle=""):
+        if ingredient_id > 0:
+            mask = self.ingredient_masks.get(ingredient_id)
+            if mask is not None:
+                return mask
+        text = f"{name_clean or ''} {name or ''}".lower()
+        mask = name_mask(text)
+        for section in (aisle or "").lower().split(";"):  # Some ingredients are stocked in several aisles.
+            intolerance = AISLE_INTOLERANCES.get(section.strip())
+            if intolerance is not None and not FREE_FROM.search(text):
+                mask |= INTOLERANCE_BITS[intolerance]
+        if ingredient_id > 0:  # Unrecognised ingredients (id 0 or -1) have nothing to cache under.
+            self.ingredient_masks[ingredient_id] = mask
+        return mask
+
+    def learn(self, rows):  # Classifies (id, name, name_clean, aisle) rows up front, e.g. RecipeStore.ingredient_rows().
+        for ingredient_id, name, name_clean, aisle in rows:
+            self.ingredient_mask(ingredient_id, name, name_clean, aisle)
+
+    def recipe_mask(self, recipe):  # For a Recipe: its ingredients' bits, plus whatever its gluten/dairy flags admit to.
+        mask = 0
+        for ingredient in recipe.ingredients:
+            mask |= self.ingredient_mask(ingredient.id, ingredient.name, ingredient.name_clean, ingredient.aisle)
+        return mask | flag_mask(recipe.gluten_free, recipe.dairy_free)
+
+    def payload_mask(self, recipe_info):  # The same, straight from a payload dict.
+        mask = 0
+        for ingredient in recipe_info.get("extendedIngredients") or ():
+            ingredient_id = ingredient.get("id")
+            mask |= self.ingredient_mask(ingredient_id if isinstance(ingredient_id, int) else 0, ingredient.get("name"), ingredient.get("nameClean"), ingredient.get("aisle"))
+        return mask | flag_mask(recipe_info.get("glutenFree"), recipe_info.get("dairyFree"))
+
+
+def flag_mask(gluten_free, dairy_free):  # None (not stated) adds nothing; only an explicit False does.
+    mask = 0
+    if gluten_free is False:
+        mask |= INTOLERANCE_BITS["gluten"]
+    if dairy_free is False:
+        mask |= INTOLERANCE_BITS["dairy"]
+    return mask
+
+
+matcher = IntoleranceMatcher()  # Shared, so each ingredient id is classified once per process.
@@ -0,0 +1,190 @@
+import re
+import zlib
+import random
+from array import array
+from itertools import chain
+from recipe_model import Recipe
+from pantry_index import normalise_name
+
+try:  # Optional, as in recipe_table: a whole batch of signatures becomes a few array operations.
+    import numpy
+except ImportError:
+    numpy = None
+
+# <<< Near-duplicate recipes: MinHash signatures with an LSH index >>>
+# Spoonacular holds many near-copies of the same recipe ("Mozzarella Sticks" three times over). Each recipe becomes a set of
+# features (its normalised ingredient names and every run of SHINGLE_WORDS instruction words), summarised by a MinHash
+# signature whose positions agree about as often as the sets overlap (Jaccard similarity). Signatures are cut into BANDS
+# bands; recipes sharing any band land in the same bucket and only those are compared, so finding duplicates costs
+# O(recipes x BANDS) rather than comparing every pair. With 32 bands of 4 rows, pairs at 0.5 similarity are caught ~87%
+# of the time, at 0.6 ~99%, while pairs below 0.2 rarely even get compared.
+
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS = NUM_PERMUTATIONS // BANDS
+THRESHOLD = 0.5  # Estimated Jaccard similarity at which two recipes count as the same recipe
+SHINGLE_WORDS = 3
+MAX_BUCKET_CHECKS = 4  # Earlier bucket members each recipe is compared with; keeps huge buckets (stock phrases) linear
+SIGNATURE_BATCH = 128  # Recipes hashed together on the NumPy path
+PRIME = (1 << 31) - 1
+_coefficients = random.Random(20240524)  # Fixed seed: signatures are stored, so every process must use the same permutations.
+COEFFICIENTS = [(_coefficients.randrange(1, PRIME), _coefficients.randrange(PRIME)) for _ in range(NUM_PERMUTATIONS)]
+WORD = re.compile(r"[a-z0-9]+")
+STEP_NUMBER = re.compile(r"^\s*\d+\.\s*", re.MULTILINE)  # The "1. " that instructions_text puts in front of each step
+
+
+def features(recipe):  # A Recipe's normalised ingredient names plus its instruction shingles.
+    found = set()
+    for ingredient in recipe.ingredients:
+        name = normalise_name(ingredient.name_clean or ingredient.name)
+        if name:
+            found.add("i:" + name)
+    words = WORD.findall(STEP_NUMBER.sub(" ", recipe.instructions.lower()))
+    for start in range(len(words) - SHINGLE_WORDS + 1):
+        found.add("s:" + " ".join(words[start:start + SHINGLE_WORDS]))
+    return found
+
+
+def feature_hashes(recipe):  # 32-bit hashes of features(recipe); crc32 is stable across processes, unlike hash().
+    return [zlib.crc32(feature.encode("utf-8")) for feature in features(recipe)]
+
+
+def _signature_python(hashes):
+    return array("I", [min((a * value + b) % PRIME for value in hashes) for a, b in COEFFICIENTS])
+
+
+def _signatures_numpy(hash_lists):  # Every recipe in one (NUM_PERMUTATIONS x total features) pass, then a min per recipe.
+    lengths = [len(hashes) for hashes in hash_lists]
+    values = numpy.fromiter(chain.from_iterable(hash_lists), dtype=numpy.uint64, count=sum(lengths))
+    starts = numpy.cumsum([0] + lengths[:-1])
+    a = numpy.array([a for a, b in COEFFICIENTS], dtype=numpy.uint64)[:, None]
+    b = numpy.array([b for a, b in COEFFICIENTS], dtype=numpy.uint64)[:, None]
+    hashed = (a * values[None, :] + b) % numpy.uint64(PRIME)  # a < 2**31 and values < 2**32, so nothing overflows 64 bits.
+    minima = numpy.minimum.reduceat(hashed, starts, axis=1).T.astype(numpy.uint32)
+    return [array("I", row.tobytes()) for row in minima]
+
+
+def signatures(recipes):  # One signature per Recipe, in order: an array("I") of NUM_PERMUTATIONS, or None for a recipe with no features.
+    hash_lists = [feature_hashes(recipe) for recipe in recipes]
+    results = [None] * len(hash_lists)
+    present = [index for index, hashes in enumerate(hash_lists) if hashes]
+    if numpy is None:
+        for index in present:
+            results[index] = _signature_python(hash_lists[index])
+        return results
+    for start in range(0, len(present), SIGNATURE_BATCH):
+        chunk = present[start:start + SIGNATURE_BATCH]
+        for index, signature in zip(chunk, _signatures_numpy([hash_lists[index] for index in chunk])):
+            results[index] = signature
+    return results
+
+
+def signature(recipe):
+    return signatures([recipe])[0]
+
+
+def similarity(first, second):  # Estimated Jaccard similarity of the two recipes' feature sets.
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERMUTATIONS
+
+
+def band_key(signature, band):
+    return signature[band * ROWS:(band + 1) * ROWS].tobytes()
+
+
+class NearDuplicateIndex:  # Recipes seen so far, bucketed by band, for "is this a copy of one of them?" lookups.
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self.signatures = {}  # Recipe id -> signature
+        self.buckets = [{} for _ in range(BANDS)]  # Per band: band bytes -> recipe ids
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.signatures
+
+    def add(self, recipe_id, signature):
+        if signature is None or recipe_id in self.signatures:
+            return
+        self.signatures[recipe_id] = signature
+        for band, buckets in enumerate(self.buckets):
+            buckets.setdefault(band_key(signature, band), []).append(recipe_id)
+
+    def find(self, signature):  # Id of the most similar indexed recipe at or above the threshold, or None.
+        if signature is None:
+            return None
+        candidates = set()
+        for band, buckets in enumerate(self.buckets):
+            candidates.update(buckets.get(band_key(signature, band), ()))
+        best, best_similarity = None, self.threshold
+        for recipe_id in candidates:
+            score = similarity(signature, self.signatures[recipe_id])
+            if score >= best_similarity:
+                best, best_similarity = recipe_id, score
+        return best
+
+
+def collapse(recipes, index=None):
+    # The Recipes that aren't near-duplicates of an earlier one, in order. With an `index` (e.g. of recipes already shown this
+    # session) copies of those are dropped too, and the survivors are added to it.
+    index = index if index is not None else NearDuplicateIndex()
+    kept = []
+    for recipe, recipe_signature in zip(recipes, signatures(recipes)):
+        if recipe.id not in index and index.find(recipe_signature) is not None:
+            continue
+        index.add(recipe.id, recipe_signature)
+        kept.append(recipe)
+    return kept
+
+
+def duplicate_map(signature_rows, threshold=THRESHOLD):
+    # {duplicate id: canonical id} for (recipe_id, signature) rows. Clusters are joined transitively; the lowest id in each is
+    # kept. One band is bucketed at a time, so memory is the signatures plus a single band's buckets.
+    by_id = {recipe_id: signature for recipe_id, signature in signature_rows if signature is not None}
+    recipe_ids = sorted(by_id)  # Bucket lists come out ascending, so comparisons look back at lower ids
+    packed = [by_id[recipe_id].tobytes() for recipe_id in recipe_ids]  # Bands are then plain bytes slices
+    width = ROWS * by_id[recipe_ids[0]].itemsize if recipe_ids else 0
+    parent = {}
+
+    def root(recipe_id):  # Union-find: `parent` only holds non-roots, each pointing at a lower id in its cluster.
+        path = []
+        while recipe_id in parent:
+            path.append(recipe_id)
+            recipe_id = parent[recipe_id]
+        for node in path:
+            parent[node] = recipe_id
+        return recipe_id
+
+    for band in range(BANDS):
+        buckets = {}
+        start, end = band * width, (band + 1) * width
+        for recipe_id, signature_bytes in zip(recipe_ids, packed):
+            buckets.setdefault(signature_bytes[start:end], []).append(recipe_id)
+        for members in buckets.values():
+            if len(members) == 1:
+                continue
+            for position in range(1, len(members)):
+                recipe_id = members[position]
+                for other in reversed(members[max(0, position - MAX_BUCKET_CHECKS):position]):
+                    first, second = root(other), root(recipe_id)
+                    if first == second:
+                        break
+                    if similarity(by_id[other], by_id[recipe_id]) >= threshold:
+                        parent[max(first, second)] = min(first, second)
+                        break
+    return {recipe_id: root(recipe_id) for recipe_id in list(parent)}
+
+
+def dedupe_store(store, threshold=THRESHOLD, batch_size=500):
+    # The batch pass: signs every recipe that has no stored signature yet, then records each near-duplicate against the recipe
+    # it copies (see RecipeStore.duplicates()). Returns {duplicate id: canonical id}.
+    batch = []
+    for recipe_info in store.unsigned_payloads(batch_size):
+        batch.append(Recipe.from_payload(recipe_info))
+        if len(batch) >= batch_size:
+            store.add_signatures([(recipe.id, recipe_signature) for recipe, recipe_signature in zip(batch, signatures(batch))])
+            batch = []
+    store.add_signatures([(recipe.id, recipe_signature) for recipe, recipe_signature in zip(batch, signatures(batch))])
+    duplicates = duplicate_map(store.signature_rows(), threshold)
+    store.set_duplicates(duplicates)
+    return duplicates
@@ -0,0 +1,125 @@
+import re
+import heapq
+from array import array
+from collections import Counter
+
+try:  # Optional, as in recipe_table: scoring becomes one bincount instead of a Counter.
+    import numpy
+except ImportError:
+    numpy = None
+
+# <<< "What can I cook with what I have?": an inverted index from ingredient ids to the recipes that use them >>>
+# A query only touches the posting lists of the pantry's ingredients, so its cost follows how common those ingredients are,
+# not the size of the corpus. Recipes are ranked by the share of their ingredients the pantry covers.
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalise_name(name):  # "Fresh  Basil Leaves" -> "fresh basil leaves"
+    return " ".join(WORD.findall((name or "").lower()))
+
+
+class PantryIndex:
+    def __init__(self):
+        self.recipe_ids = array("q")  # Row -> recipe id
+        self.totals = array("H")  # Row -> number of distinct ingredients (unrecognised lines included)
+        self.postings = {}  # Ingredient id -> array of rows using it, ascending
+        self.names = {}  # Normalised name or nameClean -> ingredient ids
+        self.words = {}  # Single word -> ingredient ids whose name contains it, for pantry items that match no name exactly
+
+    @classmethod
+    def from_store(cls, store):
+        index = cls()
+        for ingredient_id, name, name_clean, aisle in store.ingredient_rows():
+            index.add_name(ingredient_id, name)
+            index.add_name(ingredient_id, name_clean)
+        lines = {}
+        for recipe_id, ingredient_id in store.ingredient_id_rows():
+            lines.setdefault(recipe_id, []).append(ingredient_id)
+        for recipe_id in store.ids():
+            index.add_recipe(recipe_id, lines.get(recipe_id, ()))
+        return index
+
+    @classmethod
+    def from_recipes(cls, recipes):  # From recipe_model Recipes.
+        index = cls()
+        for recipe in recipes:
+            for ingredient in recipe.ingredients:
+                index.add_name(ingredient.id, ingredient.name)
+                index.add_name(ingredient.id, ingredient.name_clean)
+            index.add_recipe(recipe.id, [ingredient.id for ingredient in recipe.ingredients])
+        return index
+
+    def add_name(self, ingredient_id, name):
+        name = normalise_name(name)
+        if not name or not ingredient_id or ingredient_id <= 0:
+            return
+        self.names.setdefault(name, set()).add(ingredient_id)
+        for word in name.split():
+            self.words.setdefault(word, set()).add(ingredient_id)
+
+    def add_recipe(self, recipe_id, ingredient_ids):  # `ingredient_ids` may hold None/0/-1 for lines Spoonacular didn't recognise.
+        row = len(self.recipe_ids)
+        recognised = {ingredient_id for ingredient_id in ingredient_ids if ingredient_id and ingredient_id > 0}
+        unrecognised = sum(1 for ingredient_id in ingredient_ids if not ingredient_id or ingredient_id <= 0)
+        self.recipe_ids.append(recipe_id)
+        self.totals.append(min(len(recognised) + unrecognised, 0xFFFF))
+        for ingredient_id in recognised:
+            posting = self.postings.get(ingredient_id)
+            if posting is None:
+                posting = self.postings[ingredient_id] = array("l")
+            posting.append(row)
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def resolve(self, pantry):  # Pantry items (names or ingredient ids) -> ingredient ids. Exact names first, then every ingredient sharing a word.
+        ingredient_ids = set()
+        for item in pantry:
+            if isinstance(item, int):
+                ingredient_ids.add(item)
+                continue
+            name = normalise_name(item)
+            found = self.names.get(name) or self.names.get(name[:-1] if name.endswith("s") else name + "s")
+            if not found:
+                found = set()
+                for word in name.split():
+                    found |= self.words.get(word, set())
+            ingredient_ids |= found
+        return ingredient_ids
+
+    def best(self, pantry, limit=10, allowed=None):
+        # Top `limit` recipes by pantry coverage: [(recipe_id, coverage, covered, total)], best first. Ties go to recipes
+        # covering more ingredients. `allowed`, if given, is a set of recipe ids to choose from (e.g. RecipeTable.matching_ids()).
+        postings = [self.postings[ingredient_id] for ingredient_id in self.resolve(pantry) if ingredient_id in self.postings]
+        if not postings:
+            return []
+        if numpy is not None:
+            ranked = self._best_numpy(postings, limit, allowed)
+        else:
+            ranked = self._best_python(postings, limit, allowed)
+        return [(self.recipe_ids[row], covered / self.totals[row], covered, self.totals[row]) for row, covered in ranked]
+
+    def _best_python(self, postings, limit, allowed):
+        counts = Counter()
+        for posting in postings:
+            counts.update(posting)  # Counting runs in C; only the top-k selection below is Python.
+        totals, recipe_ids = self.totals, self.recipe_ids
+        if allowed is None:
+            scored = [(covered / totals[row], covered, -row) for row, covered in counts.items()]
+        else:
+            scored = [(covered / totals[row], covered, -row) for row, covered in counts.items() if recipe_ids[row] in allowed]
+        return [(-negative_row, covered) for _, covered, negative_row in heapq.nlargest(limit, scored)]  # Plain tuples compare in C.
+
+    def _best_numpy(self, postings, limit, allowed):
+        counts = numpy.bincount(numpy.concatenate([numpy.frombuffer(posting, dtype=numpy.dtype(posting.typecode)) for posting in postings]),
+                                minlength=len(self.recipe_ids))
+        coverage = counts / numpy.maximum(numpy.frombuffer(self.totals, dtype=numpy.uint16), 1)
+        if allowed is not None:
+            coverage[~numpy.isin(numpy.frombuffer(self.recipe_ids, dtype=numpy.int64), list(allowed))] = 0
+        candidates = numpy.flatnonzero(coverage)
+        if len(candidates) > limit:  # Everything tied with the k-th best survives, so the exact ordering below stays correct.
+            threshold = numpy.partition(coverage[candidates], len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[coverage[candidates] >= threshold]
+        ranked = sorted(zip(coverage[candidates].tolist(), counts[candidates].tolist(), (-candidates).tolist()), reverse=True)[:limit]
+        return [(-negative_row, covered) for _, covered, negative_row in ranked]
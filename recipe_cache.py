@@ -0,0 +1,153 @@
+import io
+import os
+import re
+import time
+import tempfile
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recipy", "cache")
+DEFAULT_TTL = 7 * 24 * 60 * 60  # Seconds. Recipe details barely change, so a week is safe.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # Size cap for the whole cache directory.
+EVICT_EVERY = 32  # Writes between eviction scans of the cache directory.
+
+DETAIL_PATH = re.compile(r"/recipes/(\d+)/information$")  # Path of DETAILED_RECIPE_URL
+UNCACHED_PARAMS = {"apiKey"}  # Never part of the cache key, so a new key doesn't empty the cache.
+
+
+class RecipeCache:  # On-disk cache of /information response bodies, keyed by recipe id and request params.
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, recipe_id, params=None):
+        params = sorted((name, str(value)) for name, value in (params or {}).items() if name not in UNCACHED_PARAMS)
+        suffix = hashlib.sha1(repr(params).encode("utf-8")).hexdigest()[:16] if params else "plain"
+        return os.path.join(self.directory, f"{int(recipe_id)}-{suffix}.json")
+
+    def get(self, recipe_id, params=None):  # Returns the cached response body (bytes), or None if absent or older than the TTL.
+        path = self.path_for(recipe_id, params)
+        try:
+            with open(path, "rb") as file:
+                stored_at, body = file.read().split(b"\n", 1)  # First line holds the time the entry was written.
+            stored_at = float(stored_at)
+        except OSError:
+            self.misses += 1
+            return None
+        except ValueError:  # Damaged entry: a miss, and gone so the next fetch rewrites it.
+            self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if time.time() - stored_at > self.ttl:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the "last used" time for LRU eviction.
+        except OSError:
+            pass
+        self.hits += 1
+        return body
+
+    def set(self, recipe_id, body, params=None):
+        path = self.path_for(recipe_id, params)
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(b"%f\n" % time.time())
+                file.write(body)
+            os.replace(temp_path, path)  # Atomic: other processes see either the old entry or the new one, never half a file.
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % EVICT_EVERY == 1
+        if due:
+            self.evict()
+
+    def evict(self):  # Drops expired entries, then least-recently-used ones until the cache fits in max_bytes.
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:  # Removed by another process mid-scan.
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()  # Oldest "last used" first
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class CachingAdapter(HTTPAdapter):  # Transport adapter that answers DETAILED_RECIPE_URL requests from a RecipeCache, CacheControl-style.
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        key = self.cache_key(request)
+        if key is None:
+            return super().send(request, **kwargs)
+        response = self.cached_response(request)
+        if response is not None:
+            return response
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            recipe_id, params = key
+            self.cache.set(recipe_id, response.content, params)
+        return response
+
+    def cached_response(self, request):  # The response for `request` built from the cache, or None. Never touches the network.
+        key = self.cache_key(request)
+        if key is None:
+            return None
+        recipe_id, params = key
+        body = self.cache.get(recipe_id, params)
+        if body is None:
+            return None
+        raw = HTTPResponse(body=io.BytesIO(body), headers={"Content-Type": "application/json", "X-ReciPy-Cache": "hit"},
+                           status=200, reason="OK", preload_content=False)
+        return self.build_response(request, raw)
+
+    def cache_key(self, request):  # (recipe id, params) for cacheable requests, otherwise None.
+        if request.method != "GET":
+            return None
+        url = urlsplit(request.url)
+        match = DETAIL_PATH.search(url.path)
+        if match is None:
+            return None
+        return int(match.group(1)), dict(parse_qsl(url.query))
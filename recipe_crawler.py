@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import math
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from collections import deque
+from requests import RequestException
+from spoonacular_client import API_ROOT, MAX_BULK_IDS, MAX_SEARCH_RESULTS, MAX_SEARCH_OFFSET
+from spoonacular_async import AsyncSpoonacularClient
+from spoonacular_errors import QuotaExceededError, NoApiKeyAvailable, raise_for_status
+from circuit_breaker import CircuitOpenError
+from api_key_pool import next_quota_reset
+from recipe_store import RecipeStore
+
+# <<< Corpus mirror: copies a slice of the Spoonacular catalogue into the local store, within the daily quota >>>
+# A crawl plan (an id range, or a search query's result pages) is cut into units of one request's worth. Units run a few at a
+# time; their payloads are written in batched transactions, and the checkpoint records a unit as done only after its recipes
+# are committed. A crash, Ctrl+C or a spent quota therefore costs at most one unsaved batch, and running the same command again
+# picks up the remaining units. Recipes already in the store are never fetched again.
+
+API_KEY_ENV = "SPOONACULAR_API_KEY"
+DEFAULT_CONCURRENCY = 4  # Units in flight at once
+DEFAULT_WRITE_BATCH = 500  # Recipes per store transaction (and per checkpoint)
+DEFAULT_RESERVE = 10.0  # Quota points left untouched on each key, so the interactive app still works after a crawl
+CHECKPOINT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recipy", "crawl")
+BULK_POINTS = (1.0, 0.5)  # What Spoonacular charges for /informationBulk: the first recipe, then each further one
+SEARCH_POINTS = (1.0, 0.01)  # /complexSearch: the call, then each result
+
+
+def id_plan(start, end, chunk=MAX_BULK_IDS):  # Every recipe id from `start` to `end`, inclusive.
+    return {"kind": "ids", "start": int(start), "end": int(end), "chunk": int(chunk)}
+
+
+def search_plan(query, page_size=MAX_SEARCH_RESULTS, **filters):  # Every result page of a /complexSearch query, e.g. cuisine="thai".
+    return {"kind": "search", "query": query, "page_size": int(page_size), "filters": filters}
+
+
+def plan_name(plan):  # "ids-1-100000", "search-thai-curry": the default checkpoint file name.
+    if plan["kind"] == "ids":
+        return f"ids-{plan['start']}-{plan['end']}"
+    return "search-" + (re.sub(r"[^\w]+", "-", plan["query"].lower()).strip("-") or "all")
+
+
+def bulk_points(count):
+    return 0.0 if count == 0 else BULK_POINTS[0] + BULK_POINTS[1] * (count - 1)
+
+
+class CrawlCheckpoint:  # Which units of a plan are done. Saved atomically; a checkpoint for a different plan is not reused.
+    def __init__(self, path, plan):
+        self.path = path
+        self.plan = plan
+        self.frontier = 0  # Every unit below this is done
+        self.done = set()  # Done units at or above the frontier (units finish out of order)
+        self.fetched = 0  # Recipes stored so far
+        self.points = 0.0  # Estimated quota points spent so far
+        self.total = None  # Search only: totalResults, once the first page has said
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):  # Missing or damaged: start from the beginning.
+            return
+        if data.get("plan") != plan:
+            return
+        self.frontier = data.get("frontier", 0)
+        self.done = set(data.get("done", ()))
+        self.fetched = data.get("fetched", 0)
+        self.points = data.get("points", 0.0)
+        self.total = data.get("total")
+
+    def is_done(self, unit):
+        return unit < self.frontier or unit in self.done
+
+    def complete(self, units):
+        self.done.update(units)
+        while self.frontier in self.done:
+            self.done.discard(self.frontier)
+            self.frontier += 1
+
+    def save(self):  # Atomic: a crash mid-write leaves the previous checkpoint in place.
+        data = {"plan": self.plan, "frontier": self.frontier, "done": sorted(self.done), "fetched": self.fetched,
+                "points": round(self.points, 2), "total": self.total}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temporary_path, self.path)
+
+
+class RecipeCrawler:
+    def __init__(self, client, store, plan, checkpoint_path=None, concurrency=DEFAULT_CONCURRENCY, write_batch=DEFAULT_WRITE_BATCH,
+                 reserve=DEFAULT_RESERVE, max_points=None):
+        self.client = client  # AsyncSpoonacularClient; give it a limit of at least `concurrency`.
+        self.store = store
+        self.plan = plan
+        self.checkpoint = CrawlCheckpoint(checkpoint_path or os.path.join(CHECKPOINT_DIRECTORY, plan_name(plan) + ".json"), plan)
+        self.concurrency = concurrency
+        self.write_batch = write_batch
+        self.reserve = reserve
+        self.max_points = max_points  # Optional cap for this run, on top of what the keys have left
+        self.known = set()  # Recipe ids already in the store
+        self.stopped = None  # Why the run ended early: "quota", "budget" or "circuit"
+        self.failed = 0  # Units that failed this run; they stay pending for the next one
+        self.points = 0.0  # Estimated points spent this run
+        self._pending = deque()
+        self._in_flight = 0.0  # Estimated points of the units in flight
+        self._running = 0
+        self._buffer = []  # Payloads awaiting the next write
+        self._finished = []  # Units whose payloads are all in _buffer
+        self._unsaved_points = 0.0  # Estimated points of those units
+        self._changed = None
+        self._flush_lock = None
+
+    def unit_count(self):
+        if self.plan["kind"] == "ids":
+            return math.ceil((self.plan["end"] - self.plan["start"] + 1) / self.plan["chunk"])
+        page_size = self.plan["page_size"]
+        pages = MAX_SEARCH_OFFSET // page_size + 1
+        if self.checkpoint.total is not None:
+            pages = min(pages, math.ceil(self.checkpoint.total / page_size))
+        return pages
+
+    def _unit_ids(self, unit):  # Ids mode: the ids of `unit` not stored yet.
+        first = self.plan["start"] + unit * self.plan["chunk"]
+        last = min(first + self.plan["chunk"] - 1, self.plan["end"])
+        return [recipe_id for recipe_id in range(first, last + 1) if recipe_id not in self.known]
+
+    def _cost(self, unit):  # Points the unit may cost. Search pages assume every result is new, so this is an upper bound.
+        if self.plan["kind"] == "ids":
+            return bulk_points(len(self._unit_ids(unit)))
+        if self.checkpoint.total is not None and unit * self.plan["page_size"] >= self.checkpoint.total:
+            return 0.0
+        return SEARCH_POINTS[0] + SEARCH_POINTS[1] * self.plan["page_size"] + bulk_points(self.plan["page_size"])
+
+    def _probe_cost(self):  # Points of a probe: one recipe id, or a one-result search page and its recipe.
+        if self.plan["kind"] == "ids":
+            return bulk_points(1)
+        return SEARCH_POINTS[0] + SEARCH_POINTS[1] + bulk_points(1)
+
+    def _admit(self, cost):  # "go", "probe", "wait" (for the units in flight to report back), or why to stop: "budget" or "quota".
+        if cost == 0:
+            return "go"
+        if self.max_points is not None and self.points + self._in_flight + cost > self.max_points:
+            return "wait" if self._running else "budget"
+        quotas = self.client.quota_by_key(self.reserve)
+        if not quotas:  # Every key is spent or rejected.
+            return "wait" if self._running else "quota"
+        if None in quotas:  # A key's quota is unknown until its first response: learn it from a one-recipe probe, not a full unit.
+            return "wait" if self._running else "probe"
+        if cost + self._in_flight > max(quotas):  # A unit's bulk call lands on one key, so it has to fit there, beside what's in flight.
+            return "wait" if self._running else "quota"
+        return "go"
+
+    async def _fetch(self, unit, probe=False):  # (the unit's new payloads, estimated points actually spent). A probe fetches one recipe of it.
+        spent = 0.0
+        if self.plan["kind"] == "ids":
+            recipe_ids = self._unit_ids(unit)[:1] if probe else self._unit_ids(unit)
+        else:
+            page_size = self.plan["page_size"]
+            if self.checkpoint.total is not None and unit * page_size >= self.checkpoint.total:
+                return [], 0.0
+            parameters = dict(self.plan["filters"], query=self.plan["query"], offset=unit * page_size, number=1 if probe else page_size)
+            page = raise_for_status(await self.client.search_recipes(parameters)).json()
+            self.checkpoint.total = page.get("totalResults", self.checkpoint.total)
+            results = page.get("results") or ()
+            spent = SEARCH_POINTS[0] + SEARCH_POINTS[1] * len(results)
+            recipe_ids = [result["id"] for result in results if result["id"] not in self.known]
+        if not recipe_ids:
+            return [], spent
+        self.known.update(recipe_ids)  # Claimed now, so a concurrent search page doesn't fetch the same recipe
+        try:
+            payloads = await self.client.recipe_information_bulk(recipe_ids)
+        except BaseException:
+            self.known.difference_update(recipe_ids)
+            raise
+        return [payload for payload in payloads if payload], spent + bulk_points(len(recipe_ids))
+
+    async def _worker(self):
+        while True:
+            async with self._changed:
+                while True:
+                    if self.stopped is not None or not self._pending:
+                        return
+                    unit = self._pending[0]
+                    cost = self._cost(unit)
+                    verdict = self._admit(cost)
+                    if verdict == "probe":
+                        cost = self._probe_cost()
+                        break
+                    if verdict == "go":
+                        break
+                    if verdict != "wait":
+                        self.stopped = verdict
+                        self._changed.notify_all()
+                        return
+                    await self._changed.wait()
+                probe = verdict == "probe"
+                if not probe:  # A probed unit stays first in line; its full fetch later skips the recipe the probe stored.
+                    self._pending.popleft()
+                self._in_flight += cost
+                self._running += 1
+            try:
+                payloads, spent = await self._fetch(unit, probe)
+            except (QuotaExceededError, NoApiKeyAvailable):
+                self.stopped = "quota"
+            except CircuitOpenError:
+                self.stopped = "circuit"
+            except RequestException:
+                self.failed += 1  # Left undone, so the next run tries it again
+                if probe and unit in self._pending:
+                    self._pending.remove(unit)
+            else:
+                self.points += spent
+                self._unsaved_points += spent
+                self._buffer.extend(payloads)
+                if not probe:
+                    self._finished.append(unit)
+                if len(self._buffer) >= self.write_batch:
+                    await self._flush()
+            finally:
+                async with self._changed:
+                    self._in_flight -= cost
+                    self._running -= 1
+                    self._changed.notify_all()
+
+    async def _flush(self):  # One transaction for the buffered payloads, then the checkpoint. Never the other way round.
+        async with self._flush_lock:
+            payloads, units, points = self._buffer, self._finished, self._unsaved_points
+            self._buffer, self._finished, self._unsaved_points = [], [], 0.0
+            if payloads:
+                await asyncio.to_thread(self.store.add_recipes, payloads)
+            self.checkpoint.fetched += len(payloads)
+            self.checkpoint.points += points
+            self.checkpoint.complete(units)
+            await asyncio.to_thread(self.checkpoint.save)
+
+    async def run(self):  # Returns a summary dict. Safe to call again with the same plan after any kind of interruption.
+        self._changed = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self.known = set(await asyncio.to_thread(self.store.ids))
+        self._pending = deque(unit for unit in range(self.unit_count()) if not self.checkpoint.is_done(unit))
+        try:
+            await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        finally:
+            await self._flush()
+        return self.summary()
+
+    def summary(self):
+        units = self.unit_count()
+        done = sum(1 for unit in range(units) if self.checkpoint.is_done(unit))
+        return {"units": units, "done": done, "failed": self.failed, "stopped": self.stopped, "fetched": self.checkpoint.fetched,
+                "points": round(self.checkpoint.points, 2), "quota_left": sum(points or 0.0 for points in self.client.quota_by_key()), "checkpoint": self.checkpoint.path}
+
+
+def parse_id_range(text):  # "1-100000" -> (1, 100000)
+    match = re.fullmatch(r"\s*(\d+)\s*-\s*(\d+)\s*", text)
+    if match is None or int(match.group(1)) > int(match.group(2)):
+        raise argparse.ArgumentTypeError("expected START-END, e.g. 1-100000")
+    return int(match.group(1)), int(match.group(2))
+
+
+async def main(argv=None):  # e.g. `python recipe_crawler.py --ids 1-200000`, then the same command again each day until it reports done.
+    parser = argparse.ArgumentParser(description="Mirror Spoonacular recipes into the local store, resuming where the last run stopped.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ids", type=parse_id_range, help="recipe id range to walk, e.g. 1-100000")
+    source.add_argument("--search", metavar="QUERY", help="walk every result page of this /complexSearch query")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"requests in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--write-batch", type=int, default=DEFAULT_WRITE_BATCH, help=f"recipes per store transaction (default: {DEFAULT_WRITE_BATCH})")
+    parser.add_argument("--reserve", type=float, default=DEFAULT_RESERVE, help=f"quota points to leave on each key (default: {DEFAULT_RESERVE:g})")
+    parser.add_argument("--max-points", type=float, help="spend at most this many quota points in this run")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: .recipy/crawl/<plan>.json)")
+    parser.add_argument("--api-key-env", default=API_KEY_ENV, help=f"environment variable holding the API key, or several comma-separated keys (default: {API_KEY_ENV})")
+    parser.add_argument("--api-root", default=API_ROOT)
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.write_batch < 1:
+        parser.error("--concurrency and --write-batch must be at least 1")
+    plan = id_plan(*args.ids) if args.ids else search_plan(args.search)
+
+    store = RecipeStore()
+    try:
+        async with AsyncSpoonacularClient(os.environ.get(args.api_key_env, ""), limit=args.concurrency, api_root=args.api_root) as client:
+            crawler = RecipeCrawler(client, store, plan, args.checkpoint, args.concurrency, args.write_batch, args.reserve, args.max_points)
+            summary = await crawler.run()
+    finally:
+        store.close()
+    print(f"{summary['done']}/{summary['units']} units done, {summary['fetched']} recipes stored, ~{summary['points']:g} points spent "
+          f"(checkpoint: {summary['checkpoint']}).")
+    if summary["stopped"] == "quota":
+        reset = datetime.fromtimestamp(next_quota_reset(), timezone.utc)
+        print(f"Stopped at the daily quota; run the same command again after it resets ({reset:%Y-%m-%d %H:%M} UTC) to continue.")
+    elif summary["stopped"] == "budget":
+        print("Stopped at the --max-points budget; run the same command again to continue.")
+    elif summary["stopped"] == "circuit":
+        print("Stopped: Spoonacular kept failing. Run the same command again later to continue.")
+    if summary["failed"]:
+        print(f"{summary['failed']} units failed and will be retried next run.")
+    return 0 if summary["done"] == summary["units"] else 2
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(asyncio.run(main()))
+    except KeyboardInterrupt:  # The run has already flushed and checkpointed what it had.
+        raise SystemExit(130)
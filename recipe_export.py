@@ -0,0 +1,59 @@
+import os
+import json
+from datetime import datetime
+
+LOGO = """
+        #######                      ##   #######           
+         ##   ##                           ##   ##          
+         ##   ##   #####    #####  ####    ##   ##  ##  ##  
+         ######   ##   ##  ##        ##    ######   ##  ##  
+         ## ##    #######  ##        ##    ##       ##  ##  
+         ##  ##   ##       ##        ##    ##        #####  
+         ##   ##   #####    #####  ######  ##           ##  
+                                                    ####  
+        """  # ASCII logo, shown on start-up and at the top of every export
+
+
+def make_fs_friendly(title):
+    unwanted_chars = ["<", ">", ":", "\"", "/", "\\", "|", "?", "*", " "]
+    for char in unwanted_chars:
+        title = title.replace(char, "-")
+    return title
+
+
+def render_text(recipe):  # Same layout as the interactive display, minus the pauses.
+    lines = [f"Recipe: {recipe.title}\n", "Ingredients:"]
+    lines += [f"- {ingredient}" for ingredient in recipe.ingredient_lines()]
+    lines += ["\nInstructions:", recipe.instructions]
+    return "\n".join(lines) + "\n"
+
+
+def render_markdown(recipe, vegan=False, vegetarian=False, exclusions=()):  # The "ReciPy Recipe Export" file format. The flags are the user's preferences.
+    fulldatetime = datetime.now().strftime("%a %d %b, %H:%M %z")
+    parts = [f"\n```\n{LOGO}\n```\n\n# ReciPy Recipe Export\n\nGenerated on {fulldatetime}\n"]
+    if vegan:
+        parts.append("### Dietary Preference:\nVegan")
+    if vegetarian:
+        parts.append("### Dietary Preference:\nVegetarian")
+    if len(exclusions) > 0:
+        parts.append("\n\n### Exclusions & Intolerances: ")
+        for exclusion in exclusions:
+            parts.append(f"\n* {exclusion.capitalize()}")
+    parts.append(f"\n\n## Recipe: {recipe.title}\n\n### Ingredients:\n")
+    for ingredient in recipe.ingredient_lines():
+        parts.append(f"* {ingredient}\n")
+    parts.append(f"\n### Instructions:\n{recipe.instructions}\n\nThanks for using **ReciPy**!\nData provided by [Spoonacular](www.spoonacular.com)")
+    return "".join(parts)
+
+
+def render_json(recipe):
+    instructions = recipe.instructions.split("\n") if recipe.instructions else []
+    return json.dumps({"id": recipe.id, "title": recipe.title, "ingredients": recipe.ingredient_lines(), "instructions": instructions}, ensure_ascii=False)
+
+
+def write_export(directory_path, filename, text):  # Returns the full path written.
+    os.makedirs(directory_path, exist_ok=True)
+    full_file_path = os.path.join(directory_path, filename)
+    with open(full_file_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    return full_file_path
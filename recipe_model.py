@@ -0,0 +1,93 @@
+import sys
+from recipe_parser import instructions_text
+from intolerance_matcher import matcher
+
+# <<< In-memory recipe model: what the pipeline keeps of a payload, in as few bytes as Python allows >>>
+# __slots__ drops the per-object __dict__, and the short strings that repeat across recipes (aisles, units, ingredient names)
+# are interned, so 100k recipes share one copy of "Produce" or "cup" instead of holding 100k.
+
+
+def _shared(value):  # Interned text, "" for missing values.
+    return sys.intern(value) if isinstance(value, str) and value else ""
+
+
+def _number(value):  # float, or None for missing values.
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _flag(recipe_info, key):  # True/False when the payload has the flag, None when it doesn't.
+    return bool(recipe_info[key]) if key in recipe_info else None
+
+
+class Ingredient:
+    __slots__ = ("id", "name", "name_clean", "aisle", "amount", "unit", "metric_amount", "metric_unit", "original")
+
+    def __init__(self, id=0, name="", name_clean="", aisle="", amount=None, unit="", metric_amount=None, metric_unit="", original=""):
+        self.id = id  # Spoonacular ingredient id, 0 when it didn't recognise the ingredient
+        self.name = name
+        self.name_clean = name_clean
+        self.aisle = aisle
+        self.amount = amount
+        self.unit = unit
+        self.metric_amount = metric_amount
+        self.metric_unit = metric_unit
+        self.original = original  # The line as written in the recipe, e.g. "2 cups flour, sifted". Shown to users.
+
+    @classmethod
+    def from_payload(cls, data):  # One entry of a payload's extendedIngredients.
+        metric = (data.get("measures") or {}).get("metric") or {}
+        ingredient_id = data.get("id")
+        return cls(
+            ingredient_id if isinstance(ingredient_id, int) and ingredient_id > 0 else 0,
+            _shared(data.get("name")),
+            _shared(data.get("nameClean")),
+            _shared(data.get("aisle")),
+            _number(data.get("amount")),
+            _shared(data.get("unit")),
+            _number(metric.get("amount")),
+            _shared(metric.get("unitShort")),
+            data.get("original") or "",
+        )
+
+    def __repr__(self):
+        return f"Ingredient({self.id!r}, {self.name!r})"
+
+
+class Recipe:
+    __slots__ = ("id", "title", "ingredients", "instructions", "vegan", "vegetarian", "gluten_free", "dairy_free", "intolerances")
+
+    def __init__(self, id, title="", ingredients=(), instructions="", vegan=False, vegetarian=False, gluten_free=None, dairy_free=None, intolerances=0):
+        self.id = id
+        self.title = title
+        self.ingredients = ingredients  # Tuple of Ingredient, in recipe order
+        self.instructions = instructions  # Cleaned, numbered steps, one per line
+        self.vegan = vegan
+        self.vegetarian = vegetarian
+        self.gluten_free = gluten_free  # None when the payload doesn't say
+        self.dairy_free = dairy_free
+        self.intolerances = intolerances  # intolerance_matcher bitmask of everything this recipe trips
+
+    @classmethod
+    def from_payload(cls, recipe_info):  # No printing or sleeping here, as the prefetcher calls this from its worker thread.
+        recipe_id = recipe_info.get("id")
+        recipe = cls(
+            int(recipe_id) if recipe_id is not None else 0,
+            recipe_info.get("title") or "",
+            tuple(Ingredient.from_payload(ingredient) for ingredient in recipe_info.get("extendedIngredients") or ()),
+            instructions_text(recipe_info),  # Structured steps when the payload has them; the HTML cleaner otherwise.
+            bool(recipe_info.get("vegan")),
+            bool(recipe_info.get("vegetarian")),
+            _flag(recipe_info, "glutenFree"),
+            _flag(recipe_info, "dairyFree"),
+        )
+        recipe.intolerances = matcher.recipe_mask(recipe)
+        return recipe
+
+    def allows(self, forbidden):  # True if the recipe trips none of the intolerance bits in `forbidden`.
+        return not self.intolerances & forbidden
+
+    def ingredient_lines(self):  # What users see: each ingredient as the recipe wrote it.
+        return [ingredient.original for ingredient in self.ingredients]
+
+    def __repr__(self):
+        return f"Recipe({self.id!r}, {self.title!r})"
@@ -0,0 +1,143 @@
+import re
+from html import unescape
+from instruction_cache import InstructionCache, DEFAULT_DB_PATH
+
+REQUIRED_RECIPE_FIELDS = ("title", "extendedIngredients")  # Fields Recipe.from_payload can't do without
+STEP_FIELDS = ("analyzedInstructions", "instructions")  # Either one gives us the steps. The first is already structured.
+RECIPE_PATHS = (  # All the pipeline reads of a payload (see recipe_model), for json_projection.project
+    "id", "title", "instructions", "analyzedInstructions[].steps[].step", "vegan", "vegetarian", "glutenFree", "dairyFree",
+    "extendedIngredients[].id", "extendedIngredients[].name", "extendedIngredients[].nameClean", "extendedIngredients[].aisle",
+    "extendedIngredients[].amount", "extendedIngredients[].unit", "extendedIngredients[].original",
+    "extendedIngredients[].measures.metric.amount", "extendedIngredients[].measures.metric.unitShort",
+)
+MINUTES_PER_UNIT = {"second": 1 / 60, "seconds": 1 / 60, "minute": 1, "minutes": 1, "hour": 60, "hours": 60, "day": 1440, "days": 1440}
+
+
+# <<< Instruction cleaning: one scan over the HTML, same output as the old MyHTMLParser + str.replace chain >>>
+HTML_TOKEN = re.compile(  # The markup html.parser would act on: tags (attribute values may hold ">"), comments, declarations.
+    r"<([a-zA-Z][^\t\n\r\f />\x00]*)(?:[^>'\"]|'[^']*'|\"[^\"]*\")*>"  # Start tag
+    r"|</(?:\s*([a-zA-Z][-.a-zA-Z0-9:_]*)\s*>|([a-zA-Z][^\t\n\r\f />\x00]*)[^>]*>|[^>]*>)"  # End tag; "</>" and "</ 1>" are dropped
+    r"|<!--.*?--\s*>|<!--|<![^>]*>|<\?[^>]*>",  # A bare "<!--" is a comment that never ends
+    re.DOTALL,
+)
+TAG_NAME = re.compile(r"[a-zA-Z][^\t\n\r\f />\x00]*(?:\s|/(?!>))*")  # html.parser's own tag name and attribute patterns
+ATTRIBUTE = re.compile(r"(?<=['\"\s/])[^\s/>][^\s/=>]*(?:\s*=+\s*(?:'[^']*'|\"[^\"]*\"|(?!['\"])[^>\s]*))?(?:\s|/(?!>))*")
+RAW_TEXT_ENDS = {name: re.compile(rf"</\s*{name}\s*>", re.IGNORECASE) for name in ("script", "style")}  # Their content is text up to this, markup and all
+STEP_ENDINGS = (".", "!", ".)", "!)")  # "..." and ".." end in "." already.
+LEFTOVER_TAGS = ("<ol>", "</ol>", "<p>", "</p>")  # Removed from the finished steps, in this order.
+
+
+def add_period(instruction):  # Add period to the instruction if not present.
+    instruction = instruction.strip()  # Removing any extra spaces from start and end.
+    if not instruction.endswith(STEP_ENDINGS):
+        instruction += "."
+    return instruction
+
+
+def self_closing(tag):  # "<li/>" counts as a start and an end tag, but not when the slash ends an unquoted value, as in "<li class=x/>".
+    position = TAG_NAME.match(tag, 1).end()
+    while True:
+        match = ATTRIBUTE.match(tag, position)
+        if match is None:
+            return tag[position:].strip() == "/>"
+        position = match.end()
+
+
+def list_item_steps(html_content):  # Text of each <li>...</li>, tags dropped and entities decoded, like html.parser's data events.
+    steps = []
+    parts = None  # Data chunks of the <li> being recorded, or None outside one.
+    position = 0
+    while True:
+        match = HTML_TOKEN.search(html_content, position)
+        if match is None:
+            return steps
+        if parts is not None and match.start() > position:
+            data = html_content[position:match.start()]
+            parts.append(unescape(data) if "&" in data else data)
+        position = match.end()
+        name = match.group(1)
+        if name is not None:  # Start tag
+            name = name.lower()
+            closed = match.group().endswith("/>") and self_closing(match.group())
+            if name == "li" and closed:  # html.parser reports <li/> as a start and an end tag: an empty step.
+                steps.append("")
+                parts = None
+            elif name == "li":  # <li ...> starts (or restarts) recording.
+                parts = []
+            elif name in RAW_TEXT_ENDS and not closed:
+                end = RAW_TEXT_ENDS[name].search(html_content, position)
+                if end is None:  # html.parser waits for the rest of the element, which never comes.
+                    return steps
+                if parts is not None:
+                    parts.append(html_content[position:end.start()])  # Undecoded, as html.parser passes it on
+                position = end.end()
+            continue
+        if match.group() == "<!--":  # html.parser waits for the end of the comment, which never comes.
+            return steps
+        name = match.group(2) or match.group(3)  # Other tags, comments: their text is simply skipped.
+        if name is not None and name.lower() == "li" and parts is not None:  # </li>
+            steps.append("".join(parts).strip())
+            parts = None
+
+
+def clean_html_instructions(html_content):
+    if "<li>" in html_content or "<ol>" in html_content:  # A list: one step per <li>.
+        steps = list_item_steps(html_content)
+    else:  # Plain text: one step per sentence.
+        steps = [instruction for instruction in html_content.split(".") if instruction.strip()]
+    lines = []
+    for index, step in enumerate(steps, 1):
+        step = add_period(step)
+        if "<" in step:  # Rare, so the replace passes only run on the steps that need them.
+            for tag in LEFTOVER_TAGS:
+                step = step.replace(tag, "")
+        lines.append(f"{index}. {step}")
+    return "\n".join(lines).strip()
+
+
+# <<< Structured steps: analyzedInstructions[].steps[] needs no HTML parsing, and carries timings >>>
+def step_minutes(step):  # A step's "length" in whole minutes, or None if it has none.
+    length = step.get("length") or {}
+    factor = MINUTES_PER_UNIT.get(str(length.get("unit", "")).lower())
+    if factor is None or length.get("number") is None:
+        return None
+    return round(length["number"] * factor)
+
+
+def structured_steps(recipe_info):  # [(number, text, minutes or None)] from analyzedInstructions, numbered across sections. None if there are no steps.
+    steps = []
+    for section in recipe_info.get("analyzedInstructions") or []:
+        for step in section.get("steps") or []:
+            text = (step.get("step") or "").strip()
+            if text:
+                steps.append((len(steps) + 1, text, step_minutes(step)))
+    return steps or None
+
+
+# <<< Memo for the HTML cleaner: the same recipes come back across searches, pages and runs >>>
+instruction_cache = InstructionCache(clean_html_instructions)  # Memory only until use_instruction_cache is called
+
+
+def use_instruction_cache(path=DEFAULT_DB_PATH, **options):  # Swaps in a cache with an on-disk tier (path=None: memory only). Returns it; close() it on exit.
+    global instruction_cache
+    instruction_cache.close()
+    instruction_cache = InstructionCache(clean_html_instructions, path=path, **options)
+    return instruction_cache
+
+
+def instruction_cache_stats():
+    return instruction_cache.stats()
+
+
+def instructions_text(recipe_info):  # Numbered steps, from analyzedInstructions when present, else from the HTML `instructions`.
+    steps = structured_steps(recipe_info)
+    if steps is None:
+        return instruction_cache.clean(recipe_info.get("instructions") or "")
+    return "\n".join(f"{number}. {add_period(text)}" for number, text, minutes in steps)
+
+
+def missing_recipe_fields(recipe_info):  # Returns the fields Recipe.from_payload needs but the payload doesn't have.
+    missing = [field for field in REQUIRED_RECIPE_FIELDS if field not in recipe_info]
+    if not any(field in recipe_info for field in STEP_FIELDS):
+        missing.append("instructions")
+    return missing
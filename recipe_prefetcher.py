@@ -0,0 +1,73 @@
+import threading
+from collections import deque
+
+
+class RecipePrefetcher:  # Fetches the next batch of recipes on a worker thread while the user reads the current one.
+    def __init__(self, fetch, parameters, depth=2, max_refills=3):
+        self.fetch = fetch  # Called on the worker thread with a copy of the parameters; returns a list of recipes. Must not print or prompt.
+        self.depth = depth  # Low-water mark: the worker refills once fewer than this many recipes are buffered.
+        self.max_refills = max_refills  # Fetches per wake-up at most; each one is a paid request, and a strict profile may get few recipes per batch.
+        self.last_error = None  # Last exception raised by `fetch`, left for the caller to inspect.
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._generation = 0  # Bumped whenever preferences change, so stale results are thrown away.
+        self._parameters = dict(parameters)
+        self._buffer = deque()  # Ready, already-parsed recipes for the current parameters.
+        self._thread = threading.Thread(target=self._run, name="recipe-prefetcher", daemon=True)  # Started by the first put(), not here.
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def set_parameters(self, parameters):  # Drops everything buffered if the tags/intolerances differ from what we're prefetching for.
+        with self._lock:
+            if dict(parameters) == self._parameters:
+                return
+            self._parameters = dict(parameters)
+            self._generation += 1
+            self._buffer = deque()
+        self._wake.set()
+
+    def put(self, recipes):  # Adds recipes fetched in the foreground (the rest of a batch) and starts the worker on first use.
+        with self._lock:
+            self._buffer.extend(recipes)
+            if self._thread.ident is None and not self._closed:  # Not started yet.
+                self._thread.start()
+        self._wake.set()
+
+    def take(self):  # Returns a ready recipe, or None if the buffer is empty (the caller then fetches in the foreground). Never blocks.
+        with self._lock:
+            recipe = self._buffer.popleft() if self._buffer else None
+        if recipe is not None:
+            self._wake.set()  # Let the worker check whether to top the buffer back up.
+        return recipe
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+
+    def _run(self):
+        refills = 0  # Fetches since the last wake-up
+        while not self._closed:
+            self._wake.clear()  # Cleared before checking for work, so a wake-up arriving mid-check isn't lost.
+            with self._lock:
+                generation, parameters, buffered = self._generation, dict(self._parameters), len(self._buffer)
+            if buffered >= self.depth or refills >= self.max_refills:
+                self._wake.wait()
+                refills = 0
+                continue
+            refills += 1
+            try:
+                recipes = self.fetch(parameters)
+            except Exception as error:  # Leave the error for the foreground path to report, and stop retrying until woken.
+                self.last_error = error
+                self._wake.wait()
+                refills = 0
+                continue
+            self.last_error = None
+            with self._lock:
+                if generation == self._generation:
+                    self._buffer.extend(recipes)
+            if not recipes:  # Nothing matched (or everything was seen or a near-copy): asking again right away would most likely just spend quota.
+                self._wake.wait()
+                refills = 0
@@ -0,0 +1,362 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from array import array
+from recipe_parser import instructions_text, structured_steps
+from intolerance_matcher import matcher
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recipy", "recipes.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    vegan INTEGER NOT NULL DEFAULT 0,
+    vegetarian INTEGER NOT NULL DEFAULT 0,
+    gluten_free INTEGER NOT NULL DEFAULT 0,
+    dairy_free INTEGER NOT NULL DEFAULT 0,
+    ready_in_minutes INTEGER,
+    price_per_serving REAL,
+    health_score REAL,
+    intolerances INTEGER NOT NULL DEFAULT 0,  -- intolerance_matcher bitmask of the whole payload (ingredients and flags)
+    payload TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recipes_vegan ON recipes (vegan);
+CREATE INDEX IF NOT EXISTS recipes_vegetarian ON recipes (vegetarian);
+CREATE INDEX IF NOT EXISTS recipes_gluten_free ON recipes (gluten_free);
+CREATE INDEX IF NOT EXISTS recipes_dairy_free ON recipes (dairy_free);
+CREATE INDEX IF NOT EXISTS recipes_ready_in_minutes ON recipes (ready_in_minutes);
+CREATE INDEX IF NOT EXISTS recipes_price_per_serving ON recipes (price_per_serving);
+
+CREATE TABLE IF NOT EXISTS ingredients (
+    id INTEGER PRIMARY KEY,  -- Spoonacular ingredient id
+    name TEXT NOT NULL DEFAULT '',
+    name_clean TEXT,
+    aisle TEXT
+);
+
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    ingredient_id INTEGER REFERENCES ingredients (id),  -- NULL when Spoonacular didn't recognise the ingredient
+    amount REAL,
+    unit TEXT,
+    original TEXT,
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE INDEX IF NOT EXISTS recipe_ingredients_ingredient ON recipe_ingredients (ingredient_id);
+
+CREATE TABLE IF NOT EXISTS recipe_steps (  -- From analyzedInstructions; empty for recipes that only have HTML instructions
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    number INTEGER NOT NULL,  -- 1-based, counted across every instruction section
+    step TEXT NOT NULL,
+    length_minutes INTEGER,  -- NULL when Spoonacular gives the step no timing
+    PRIMARY KEY (recipe_id, number)
+);
+CREATE INDEX IF NOT EXISTS recipe_steps_length_minutes ON recipe_steps (length_minutes);
+
+CREATE TABLE IF NOT EXISTS recipe_signatures (  -- near_duplicates MinHash signatures; dropped whenever the payload is rewritten
+    recipe_id INTEGER PRIMARY KEY REFERENCES recipes (id) ON DELETE CASCADE,
+    signature BLOB NOT NULL  -- Packed unsigned 32-bit ints; empty for recipes with nothing to compare
+);
+
+CREATE TABLE IF NOT EXISTS recipe_duplicates (  -- From the last near_duplicates.dedupe_store() pass
+    recipe_id INTEGER PRIMARY KEY REFERENCES recipes (id) ON DELETE CASCADE,
+    canonical_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE  -- The copy that is kept
+);
+"""
+
+# Full-text index over what users actually search for. rowid is the recipe id.
+SEARCH_SCHEMA = "CREATE VIRTUAL TABLE recipe_search USING fts5 (title, ingredients, instructions, tokenize = 'porter unicode61')"
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0)  # bm25 weights for title, ingredients, instructions
+TIME_LIMIT = re.compile(r"\b(?:under|in|within|less than)\s+(\d+)\s*(?:m|min|mins|minutes)\b", re.IGNORECASE)  # "under 30 min"
+
+# Filters accepted by RecipeStore.find(), mapped to their SQL condition.
+FILTERS = {
+    "vegan": "vegan = ?",
+    "vegetarian": "vegetarian = ?",
+    "gluten_free": "gluten_free = ?",
+    "dairy_free": "dairy_free = ?",
+    "max_ready_minutes": "ready_in_minutes <= ?",
+    "max_price": "price_per_serving <= ?",
+    "max_step_minutes": "id NOT IN (SELECT recipe_id FROM recipe_steps WHERE length_minutes > ?)",  # No single step longer than this
+    "distinct": "id NOT IN (SELECT recipe_id FROM recipe_duplicates WHERE ?)",  # True: leave out known near-duplicates
+}
+DISTINCT = "id NOT IN (SELECT recipe_id FROM recipe_duplicates)"
+
+
+def filter_conditions(filters):  # Keyword filters -> (SQL conditions, values). None means "don't care".
+    conditions = []
+    values = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name not in FILTERS:
+            raise TypeError(f"Unknown recipe filter: {name}")
+        conditions.append(FILTERS[name])
+        values.append(int(value) if isinstance(value, bool) else value)
+    return conditions, values
+
+
+def recipe_row(recipe_info, fetched_at):
+    return (
+        int(recipe_info["id"]),
+        recipe_info.get("title") or "",
+        int(bool(recipe_info.get("vegan"))),
+        int(bool(recipe_info.get("vegetarian"))),
+        int(bool(recipe_info.get("glutenFree"))),
+        int(bool(recipe_info.get("dairyFree"))),
+        recipe_info.get("readyInMinutes"),
+        recipe_info.get("pricePerServing"),
+        recipe_info.get("healthScore"),
+        matcher.payload_mask(recipe_info),
+        json.dumps(recipe_info, separators=(",", ":")),
+        fetched_at,
+    )
+
+
+def search_row(recipe_info):
+    return (
+        int(recipe_info["id"]),
+        recipe_info.get("title") or "",
+        "\n".join(ingredient.get("original") or "" for ingredient in recipe_info.get("extendedIngredients") or []),
+        instructions_text(recipe_info),
+    )
+
+
+def step_rows(recipe_info):
+    recipe_id = int(recipe_info["id"])
+    return [(recipe_id, number, text, minutes) for number, text, minutes in structured_steps(recipe_info) or []]
+
+
+def fts_query(text):  # Free text -> FTS5 query. Every word is quoted, so stray punctuation can't break the MATCH syntax.
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text.lower()))
+
+
+class RecipeStore:  # SQLite store of every recipe payload we've fetched, with indexed diet/time/price columns.
+    def __init__(self, path=DEFAULT_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()  # One connection shared by the foreground and the prefetcher's worker thread.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")  # Readers in other processes don't block our writes.
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self._lock, self.connection:
+            has_steps = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'recipe_steps'").fetchone()
+            self.connection.executescript(SCHEMA)
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(recipes)")}
+            has_intolerances = "intolerances" in columns
+            if not has_intolerances:
+                self.connection.execute("ALTER TABLE recipes ADD COLUMN intolerances INTEGER NOT NULL DEFAULT 0")
+            has_search = self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'recipe_search'").fetchone()
+            if not has_search:
+                self.connection.execute(SEARCH_SCHEMA)
+        if not has_search:  # Stores created before search existed get their index built once.
+            self.rebuild_search_index()
+        if not has_steps:  # Likewise for stores created before recipe_steps.
+            self.rebuild_steps()
+        if not has_intolerances:  # And for stores created before the intolerances column.
+            self.rebuild_intolerances()
+
+    def add_recipes(self, recipes):  # Inserts or updates a batch of payloads in a single transaction. Returns how many were written.
+        fetched_at = time.time()
+        recipe_rows = []
+        ingredient_rows = {}
+        recipe_ingredient_rows = []
+        search_rows = []
+        recipe_step_rows = []
+        for recipe_info in recipes:
+            if not recipe_info or recipe_info.get("id") is None:
+                continue
+            recipe_rows.append(recipe_row(recipe_info, fetched_at))
+            search_rows.append(search_row(recipe_info))
+            recipe_step_rows.extend(step_rows(recipe_info))
+            recipe_id = int(recipe_info["id"])
+            for position, ingredient in enumerate(recipe_info.get("extendedIngredients") or []):
+                ingredient_id = ingredient.get("id")
+                if ingredient_id is not None and ingredient_id > 0:
+                    ingredient_rows[ingredient_id] = (ingredient_id, ingredient.get("name") or "", ingredient.get("nameClean"), ingredient.get("aisle"))
+                else:
+                    ingredient_id = None
+                recipe_ingredient_rows.append((recipe_id, position, ingredient_id, ingredient.get("amount"), ingredient.get("unit"), ingredient.get("original")))
+        if not recipe_rows:
+            return 0
+        with self._lock, self.connection:  # Commits once at the end, or rolls the whole batch back.
+            self.connection.executemany(
+                "INSERT INTO recipes (id, title, vegan, vegetarian, gluten_free, dairy_free, ready_in_minutes, price_per_serving, health_score, intolerances, "
+                "payload, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET title = excluded.title, vegan = excluded.vegan, vegetarian = excluded.vegetarian, "
+                "gluten_free = excluded.gluten_free, dairy_free = excluded.dairy_free, ready_in_minutes = excluded.ready_in_minutes, "
+                "price_per_serving = excluded.price_per_serving, health_score = excluded.health_score, intolerances = excluded.intolerances, "
+                "payload = excluded.payload, fetched_at = excluded.fetched_at",
+                recipe_rows,
+            )
+            self.connection.executemany(
+                "INSERT INTO ingredients (id, name, name_clean, aisle) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET name = excluded.name, name_clean = excluded.name_clean, aisle = excluded.aisle",
+                ingredient_rows.values(),
+            )
+            self.connection.executemany("DELETE FROM recipe_ingredients WHERE recipe_id = ?", [(row[0],) for row in recipe_rows])
+            self.connection.executemany(
+                "INSERT INTO recipe_ingredients (recipe_id, position, ingredient_id, amount, unit, original) VALUES (?, ?, ?, ?, ?, ?)",
+                recipe_ingredient_rows,
+            )
+            self.connection.executemany("DELETE FROM recipe_steps WHERE recipe_id = ?", [(row[0],) for row in recipe_rows])
+            self.connection.executemany("INSERT INTO recipe_steps (recipe_id, number, step, length_minutes) VALUES (?, ?, ?, ?)", recipe_step_rows)
+            self.connection.executemany("DELETE FROM recipe_signatures WHERE recipe_id = ?", [(row[0],) for row in recipe_rows])  # Re-signed on the next dedupe pass
+            self.connection.executemany("DELETE FROM recipe_search WHERE rowid = ?", [(row[0],) for row in search_rows])  # Keeps the index in step with each batch.
+            self.connection.executemany("INSERT INTO recipe_search (rowid, title, ingredients, instructions) VALUES (?, ?, ?, ?)", search_rows)
+        return len(recipe_rows)
+
+    def rebuild_search_index(self, batch_size=500):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM recipe_search")
+            batch = []
+            for recipe_info in self.payloads(batch_size):
+                batch.append(search_row(recipe_info))
+                if len(batch) >= batch_size:
+                    self.connection.executemany("INSERT INTO recipe_search (rowid, title, ingredients, instructions) VALUES (?, ?, ?, ?)", batch)
+                    batch = []
+            self.connection.executemany("INSERT INTO recipe_search (rowid, title, ingredients, instructions) VALUES (?, ?, ?, ?)", batch)
+            self.connection.execute("INSERT INTO recipe_search (recipe_search) VALUES ('optimize')")
+
+    def rebuild_steps(self, batch_size=500):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM recipe_steps")
+            batch = []
+            for recipe_info in self.payloads(batch_size):
+                batch.extend(step_rows(recipe_info))
+                if len(batch) >= batch_size:
+                    self.connection.executemany("INSERT INTO recipe_steps (recipe_id, number, step, length_minutes) VALUES (?, ?, ?, ?)", batch)
+                    batch = []
+            self.connection.executemany("INSERT INTO recipe_steps (recipe_id, number, step, length_minutes) VALUES (?, ?, ?, ?)", batch)
+
+    def rebuild_intolerances(self, batch_size=500):  # Recomputes every recipe's intolerances mask, e.g. after the keyword lists change.
+        with self._lock, self.connection:
+            batch = []
+            for recipe_info in self.payloads(batch_size):
+                batch.append((matcher.payload_mask(recipe_info), int(recipe_info["id"])))
+                if len(batch) >= batch_size:
+                    self.connection.executemany("UPDATE recipes SET intolerances = ? WHERE id = ?", batch)
+                    batch = []
+            self.connection.executemany("UPDATE recipes SET intolerances = ? WHERE id = ?", batch)
+
+    def steps(self, recipe_id):  # [(number, step, length_minutes)] for a stored recipe, in order.
+        with self._lock:
+            return self.connection.execute(
+                "SELECT number, step, length_minutes FROM recipe_steps WHERE recipe_id = ? ORDER BY number", (int(recipe_id),)
+            ).fetchall()
+
+    def add_recipe(self, recipe_info):
+        return self.add_recipes([recipe_info])
+
+    def get(self, recipe_id):  # The stored payload, or None.
+        with self._lock:
+            row = self.connection.execute("SELECT payload FROM recipes WHERE id = ?", (int(recipe_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, recipe_id):
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM recipes WHERE id = ?", (int(recipe_id),)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def ids(self):
+        with self._lock:
+            return [row[0] for row in self.connection.execute("SELECT id FROM recipes ORDER BY id")]
+
+    def payloads(self, batch_size=500, distinct=False):  # Yields every stored payload (but known near-duplicates, if `distinct`), a page at a time.
+        return self._paged_payloads(DISTINCT if distinct else "1", batch_size)
+
+    def unsigned_payloads(self, batch_size=500):  # Payloads with no near-duplicate signature yet.
+        return self._paged_payloads("id NOT IN (SELECT recipe_id FROM recipe_signatures)", batch_size)
+
+    def _paged_payloads(self, condition, batch_size):  # Keyset pagination, so large stores don't sit in memory at once.
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self.connection.execute(
+                    f"SELECT id, payload FROM recipes WHERE id > ? AND {condition} ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for recipe_id, payload in rows:
+                yield json.loads(payload)
+            last_id = rows[-1][0]
+
+    def signature_rows(self):  # (recipe_id, signature) for every signed recipe; signature is an array("I"), or None if empty.
+        with self._lock:
+            rows = self.connection.execute("SELECT recipe_id, signature FROM recipe_signatures").fetchall()
+        return [(recipe_id, array("I", signature) if signature else None) for recipe_id, signature in rows]
+
+    def add_signatures(self, rows):  # (recipe_id, array("I") or None) pairs.
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO recipe_signatures (recipe_id, signature) VALUES (?, ?)",
+                [(recipe_id, signature.tobytes() if signature is not None else b"") for recipe_id, signature in rows],
+            )
+
+    def duplicates(self):  # {duplicate id: canonical id} as of the last dedupe pass.
+        with self._lock:
+            return dict(self.connection.execute("SELECT recipe_id, canonical_id FROM recipe_duplicates"))
+
+    def set_duplicates(self, duplicates):  # Replaces the whole mapping in one transaction.
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM recipe_duplicates")
+            self.connection.executemany("INSERT INTO recipe_duplicates (recipe_id, canonical_id) VALUES (?, ?)", duplicates.items())
+
+    def column_rows(self, distinct=False):  # (id, vegan, vegetarian, gluten_free, dairy_free, ready_in_minutes, price_per_serving, health_score, intolerances) per recipe, by id.
+        with self._lock:
+            return self.connection.execute(
+                "SELECT id, vegan, vegetarian, gluten_free, dairy_free, ready_in_minutes, price_per_serving, health_score, intolerances FROM recipes "
+                f"WHERE {DISTINCT if distinct else '1'} ORDER BY id"
+            ).fetchall()
+
+    def ingredient_id_rows(self):  # (recipe_id, ingredient_id) for every ingredient line, in recipe order. ingredient_id is None if unrecognised.
+        with self._lock:
+            return self.connection.execute("SELECT recipe_id, ingredient_id FROM recipe_ingredients ORDER BY recipe_id, position").fetchall()
+
+    def ingredient_rows(self):  # (id, name, name_clean, aisle) for every distinct ingredient seen.
+        with self._lock:
+            return self.connection.execute("SELECT id, name, name_clean, aisle FROM ingredients").fetchall()
+
+    def find(self, limit=None, **filters):  # e.g. find(vegan=True, max_ready_minutes=30). Returns matching payloads.
+        conditions, values = filter_conditions(filters)
+        sql = "SELECT payload FROM recipes"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(int(limit))
+        with self._lock:
+            rows = self.connection.execute(sql, values).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def search(self, text, limit=10, **filters):  # Ranked full-text search, e.g. search("chickpea curry under 30 min", vegan=True).
+        time_limit = TIME_LIMIT.search(text)
+        if time_limit and filters.get("max_ready_minutes") is None:
+            filters["max_ready_minutes"] = int(time_limit.group(1))
+            text = TIME_LIMIT.sub(" ", text)
+        query = fts_query(text)
+        if not query:
+            return self.find(limit=limit, **filters)
+        conditions, values = filter_conditions(filters)
+        sql = "SELECT recipes.payload FROM recipe_search JOIN recipes ON recipes.id = recipe_search.rowid WHERE recipe_search MATCH ?"
+        for condition in conditions:
+            sql += " AND recipes." + condition
+        sql += " ORDER BY bm25(recipe_search, ?, ?, ?) LIMIT ?"
+        with self._lock:
+            rows = self.connection.execute(sql, [query, *values, *SEARCH_WEIGHTS, int(limit)]).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,179 @@
+import math
+import random
+from array import array
+from intolerance_matcher import matcher, intolerance_bits
+
+try:  # Optional: without NumPy the same columns are scanned in Python, which is fine for a few thousand recipes.
+    import numpy
+except ImportError:
+    numpy = None
+
+# <<< Columnar recipe table: one array per field instead of one dict per recipe, for scans and random picks >>>
+# Ingredient lists are stored CSR-style: row i's ingredient ids are ingredient_ids[offsets[i]:offsets[i + 1]].
+# Missing numbers are NaN, which fails every comparison, the same way SQL NULL does in RecipeStore.find().
+# The intolerances column holds intolerance_matcher bitmasks, so excluding any set of intolerances is one AND per row.
+
+FLAG_COLUMNS = ("vegan", "vegetarian", "gluten_free", "dairy_free")
+NUMBER_COLUMNS = ("ready_in_minutes", "price_per_serving", "health_score")
+PAYLOAD_KEYS = {"vegan": "vegan", "vegetarian": "vegetarian", "gluten_free": "glutenFree", "dairy_free": "dairyFree",
+                "ready_in_minutes": "readyInMinutes", "price_per_serving": "pricePerServing", "health_score": "healthScore"}
+
+# Filters accepted by matches(), pick() and sample(): (column, comparison). Names follow recipe_store.FILTERS where they overlap.
+FILTERS = {
+    "vegan": ("vegan", "=="),
+    "vegetarian": ("vegetarian", "=="),
+    "gluten_free": ("gluten_free", "=="),
+    "dairy_free": ("dairy_free", "=="),
+    "max_ready_minutes": ("ready_in_minutes", "<="),
+    "max_price": ("price_per_serving", "<="),
+    "min_health_score": ("health_score", ">="),
+    "with_ingredients": (None, "all"),  # Ingredient ids that must all be in the recipe
+    "without_ingredients": (None, "none"),  # Ingredient ids that must not be
+    "without_intolerances": ("intolerances", "&"),  # Intolerance names (or the API's comma-separated string) the recipe must not trip
+}
+
+
+def table_filters(parameters):  # The API's /random `parameters` dict (tags, intolerances) as the filters above, for picking offline.
+    tags = {tag.strip() for tag in (parameters.get("tags") or "").split(",")}
+    return {"vegan": "vegan" in tags or None, "vegetarian": "vegetarian" in tags or None, "without_intolerances": parameters.get("intolerances") or None}
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else math.nan
+
+
+class RecipeTable:
+    def __init__(self):
+        self.ids = array("q")
+        self.flags = {name: array("b") for name in FLAG_COLUMNS}
+        self.numbers = {name: array("d") for name in NUMBER_COLUMNS}
+        self.offsets = array("q", [0])
+        self.ingredient_ids = array("q")
+        self.intolerances = array("H")  # 12 intolerance bits per recipe
+        self._columns = None  # NumPy views of the arrays above, made on the first query after a change.
+
+    @classmethod
+    def from_payloads(cls, payloads):
+        table = cls()
+        for recipe_info in payloads:
+            if not recipe_info or recipe_info.get("id") is None:
+                continue
+            ingredient_ids = [ingredient.get("id") for ingredient in recipe_info.get("extendedIngredients") or ()]
+            table.append(int(recipe_info["id"]), [recipe_info.get(PAYLOAD_KEYS[name]) for name in FLAG_COLUMNS + NUMBER_COLUMNS], ingredient_ids,
+                         matcher.payload_mask(recipe_info))
+        return table
+
+    @classmethod
+    def from_store(cls, store, distinct=False):  # Straight from RecipeStore's indexed columns, without decoding a single payload. `distinct` drops known near-duplicates.
+        table = cls()
+        ingredients = {}
+        for recipe_id, ingredient_id in store.ingredient_id_rows():
+            ingredients.setdefault(recipe_id, []).append(ingredient_id)
+        for row in store.column_rows(distinct):  # The stored mask is payload_mask's, so unrecognised lines and unstated flags count the same way.
+            table.append(row[0], row[1:-1], ingredients.get(row[0], ()), row[-1])
+        return table
+
+    def append(self, recipe_id, values, ingredient_ids, intolerances=0):  # `values` follow FLAG_COLUMNS then NUMBER_COLUMNS.
+        self._columns = None  # First, as arrays can't grow while NumPy views of them exist.
+        self.ids.append(recipe_id)
+        for name, value in zip(FLAG_COLUMNS, values):
+            self.flags[name].append(1 if value else 0)
+        for name, value in zip(NUMBER_COLUMNS, values[len(FLAG_COLUMNS):]):
+            self.numbers[name].append(_number(value))
+        self.ingredient_ids.extend(ingredient_id for ingredient_id in ingredient_ids if isinstance(ingredient_id, int) and ingredient_id > 0)
+        self.offsets.append(len(self.ingredient_ids))
+        self.intolerances.append(intolerances)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ingredients(self, row):  # Ingredient ids of one row.
+        return self.ingredient_ids[self.offsets[row]:self.offsets[row + 1]]
+
+    def matches(self, **filters):  # Row indexes passing every filter, e.g. matches(vegan=True, gluten_free=True, max_ready_minutes=30).
+        checks = []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in FILTERS:
+                raise TypeError(f"Unknown recipe filter: {name}")
+            checks.append((*FILTERS[name], value))
+        if numpy is not None:
+            return self._matches_numpy(checks)
+        return self._matches_python(checks)
+
+    def matching_ids(self, **filters):  # Recipe ids passing every filter, in row order.
+        rows = self.matches(**filters)
+        if numpy is not None:
+            return numpy.frombuffer(self.ids, dtype=numpy.int64)[rows].tolist()
+        return [self.ids[row] for row in rows]
+
+    def pick(self, seen=None, **filters):  # Id of a random matching recipe, or None. Ids in `seen` (a SeenRecipes) are skipped.
+        picked = self.sample(1, seen, **filters)
+        return picked[0] if picked else None
+
+    def sample(self, count, seen=None, **filters):  # Ids of up to `count` distinct random matching recipes, skipping any in `seen`.
+        rows = self.matches(**filters)
+        draws = min(len(rows), count if seen is None else 2 * count + 8)  # A few spare draws to cover recipes already seen
+        picked = [int(self.ids[int(rows[index])]) for index in random.sample(range(len(rows)), draws)]
+        if seen is not None:
+            picked = seen.unseen(picked)
+            if len(picked) < count and draws < len(rows):  # Mostly seen already: sift every match once.
+                candidates = seen.unseen(self.ids[int(row)] for row in rows)
+                picked = random.sample(candidates, min(count, len(candidates)))
+        return picked[:count]
+
+    def _numpy_columns(self):
+        if self._columns is None:
+            columns = {name: numpy.frombuffer(column, dtype=bool) for name, column in self.flags.items()}  # Stored as 0/1 bytes, so no copy
+            columns.update((name, numpy.frombuffer(column, dtype=numpy.float64)) for name, column in self.numbers.items())
+            columns["intolerances"] = numpy.frombuffer(self.intolerances, dtype=numpy.uint16)
+            ingredient_ids = numpy.frombuffer(self.ingredient_ids, dtype=numpy.int64)
+            # Row of every ingredient entry, so "rows containing X" is one boolean index instead of a loop over offsets.
+            rows = numpy.repeat(numpy.arange(len(self.ids)), numpy.diff(numpy.frombuffer(self.offsets, dtype=numpy.int64)))
+            self._columns = columns, ingredient_ids, rows
+        return self._columns
+
+    def _matches_numpy(self, checks):
+        columns, ingredient_ids, ingredient_rows = self._numpy_columns()
+        mask = numpy.ones(len(self.ids), dtype=bool)
+        for column, comparison, value in checks:
+            if comparison == "==":
+                mask &= columns[column] == bool(value)
+            elif comparison == "<=":
+                mask &= columns[column] <= value
+            elif comparison == ">=":
+                mask &= columns[column] >= value
+            elif comparison == "&":
+                mask &= (columns[column] & intolerance_bits(value)) == 0
+            elif comparison == "all":
+                for ingredient_id in value:
+                    has = numpy.zeros(len(self.ids), dtype=bool)
+                    has[ingredient_rows[ingredient_ids == ingredient_id]] = True
+                    mask &= has
+            else:  # "none"
+                mask[ingredient_rows[numpy.isin(ingredient_ids, list(value))]] = False
+        return numpy.flatnonzero(mask)
+
+    def _matches_python(self, checks):
+        rows = range(len(self.ids))
+        for column, comparison, value in checks:
+            if comparison == "==":
+                flags, wanted = self.flags[column], int(bool(value))
+                rows = [row for row in rows if flags[row] == wanted]
+            elif comparison == "<=":
+                numbers = self.numbers[column]
+                rows = [row for row in rows if numbers[row] <= value]
+            elif comparison == ">=":
+                numbers = self.numbers[column]
+                rows = [row for row in rows if numbers[row] >= value]
+            elif comparison == "&":
+                intolerances, forbidden = self.intolerances, intolerance_bits(value)
+                rows = [row for row in rows if not intolerances[row] & forbidden]
+            elif comparison == "all":
+                wanted = set(value)
+                rows = [row for row in rows if wanted.issubset(self.ingredients(row))]
+            else:  # "none"
+                unwanted = set(value)
+                rows = [row for row in rows if unwanted.isdisjoint(self.ingredients(row))]
+        return list(rows)
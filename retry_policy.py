@@ -0,0 +1,57 @@
+import time
+import random
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = {402, 429, 500, 502, 503, 504}  # 402 only when the API also sends Retry-After; otherwise the quota is gone for the day.
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF = 0.5  # Seconds before the first retry, doubling after each one.
+DEFAULT_MAX_BACKOFF = 8.0
+DEFAULT_DEADLINE = 30.0  # Seconds per request, retries and waits included.
+
+
+def parse_retry_after(value, now=None):  # Retry-After as seconds from now; it may be a number of seconds or an HTTP date. None if absent or unreadable.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+
+class RetryPolicy:  # Which failures to retry, and how long to wait: exponential backoff with full jitter, or longer if the server asks.
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+                 deadline=DEFAULT_DEADLINE, statuses=RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = set(statuses)
+
+    def next_delay(self, attempts, elapsed, response=None):
+        # Seconds to wait before attempt number `attempts + 1`, or None to give up. `response` is None when the attempt raised
+        # a connection error or timeout, which are always worth another try.
+        if attempts >= self.max_attempts:
+            return None
+        retry_after = None
+        if response is not None:
+            if response.status_code not in self.statuses:
+                return None
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 402 and retry_after is None:
+                return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempts - 1)))  # Full jitter spreads out clients that failed together.
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if elapsed + delay >= self.deadline:
+            return None
+        return delay
+
+    def attempt_timeout(self, timeout, elapsed):  # (connect, read) clipped to what's left of the deadline.
+        remaining = max(self.deadline - elapsed, 0.001)
+        connect_timeout, read_timeout = timeout
+        return min(connect_timeout, remaining), min(read_timeout, remaining)
+
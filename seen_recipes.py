@@ -0,0 +1,164 @@
+import os
+import re
+import math
+import struct
+import hashlib
+import threading
+
+# <<< Recipes a profile has already been shown, so random picks don't repeat them >>>
+# A scalable Bloom filter: a chain of fixed-size filters, each new one twice as big with half the error rate of the last, so
+# memory grows with what the user has actually seen (about 1.8 KB per 1,000 recipes at 0.1%), and the combined
+# false-positive rate stays under `error_rate`. False positives only mean an unseen recipe is occasionally skipped.
+
+DEFAULT_PROFILE = "default"
+DEFAULT_ERROR_RATE = 0.001
+DEFAULT_INITIAL_CAPACITY = 1024  # Recipes the first filter holds
+GROWTH = 2  # Each new filter holds this many times more recipes than the last...
+TIGHTENING = 0.5  # ...at this fraction of its error rate. The per-filter rates sum to at most error_rate.
+SEEN_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".recipy", "seen")
+MAGIC = b"RSBF1"
+FILTER_HEADER = struct.Struct("<QQIQd")  # capacity, count, hashes, size in bits, error rate
+
+
+def _hash_pair(key):  # Two independent 64-bit hashes of a recipe id; every bit position is derived from them.
+    first, second = struct.unpack("<QQ", hashlib.blake2b(str(key).encode("ascii"), digest_size=16).digest())
+    return first, second | 1  # Odd, so the probe sequence never collapses onto one bit.
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate, hashes=None, size=None, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = size or max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count  # Keys added; the filter is retired once this reaches capacity.
+
+    def _positions(self, first, second):
+        size = self.size
+        return [(first + index * second) % size for index in range(self.hashes)]
+
+    def contains(self, first, second):  # Stops at the first clear bit, which for unseen ids is usually the first or second probe.
+        bits, size = self.bits, self.size
+        position = first % size
+        step = second % size
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+            if position >= size:
+                position -= size
+        return True
+
+    def add(self, first, second):
+        bits = self.bits
+        for position in self._positions(first, second):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter:
+    def __init__(self, error_rate=DEFAULT_ERROR_RATE, initial_capacity=DEFAULT_INITIAL_CAPACITY, filters=None):
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.filters = filters or []
+
+    def __contains__(self, key):
+        first, second = _hash_pair(key)
+        return any(bloom.contains(first, second) for bloom in self.filters)
+
+    def add(self, key):  # Returns False if the key was (probably) there already.
+        first, second = _hash_pair(key)
+        if any(bloom.contains(first, second) for bloom in self.filters):
+            return False
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            if self.filters:
+                capacity, error_rate = self.filters[-1].capacity * GROWTH, self.filters[-1].error_rate * TIGHTENING
+            else:
+                capacity, error_rate = self.initial_capacity, self.error_rate * (1 - TIGHTENING)
+            self.filters.append(BloomFilter(capacity, error_rate))
+        self.filters[-1].add(first, second)
+        return True
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def to_bytes(self):
+        parts = [MAGIC, struct.pack("<I", len(self.filters))]
+        for bloom in self.filters:
+            parts.append(FILTER_HEADER.pack(bloom.capacity, bloom.count, bloom.hashes, bloom.size, bloom.error_rate))
+            parts.append(bytes(bloom.bits))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, error_rate=DEFAULT_ERROR_RATE, initial_capacity=DEFAULT_INITIAL_CAPACITY):  # Raises ValueError if `data` isn't ours.
+        if not data.startswith(MAGIC):
+            raise ValueError("not a seen-recipes filter")
+        offset = len(MAGIC)
+        (filter_count,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        filters = []
+        for _ in range(filter_count):
+            capacity, count, hashes, size, filter_error_rate = FILTER_HEADER.unpack_from(data, offset)
+            offset += FILTER_HEADER.size
+            length = (size + 7) // 8
+            if offset + length > len(data):
+                raise ValueError("truncated seen-recipes filter")
+            filters.append(BloomFilter(capacity, filter_error_rate, hashes, size, bytearray(data[offset:offset + length]), count))
+            offset += length
+        return cls(error_rate, initial_capacity, filters)
+
+
+class SeenRecipes:  # One profile's seen recipe ids, in .recipy/seen/<profile>.bloom. Shared by the foreground and the prefetcher's thread.
+    def __init__(self, profile=DEFAULT_PROFILE, directory=SEEN_DIRECTORY, error_rate=DEFAULT_ERROR_RATE):
+        self.profile = profile
+        self.path = os.path.join(directory, re.sub(r"[^\w-]", "_", profile) + ".bloom")
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.filter = ScalableBloomFilter(error_rate)
+        try:
+            with open(self.path, "rb") as file:
+                self.filter = ScalableBloomFilter.from_bytes(file.read(), error_rate)
+        except (OSError, ValueError, struct.error):  # Missing, unreadable or damaged: start afresh rather than refuse to run.
+            pass
+
+    def __contains__(self, recipe_id):
+        with self._lock:
+            return recipe_id in self.filter
+
+    def __len__(self):
+        return len(self.filter)
+
+    def add(self, recipe_id):
+        with self._lock:
+            if self.filter.add(recipe_id):
+                self._dirty = True
+
+    def unseen(self, recipe_ids):  # The ids not seen yet, in order.
+        with self._lock:
+            return [recipe_id for recipe_id in recipe_ids if recipe_id not in self.filter]
+
+    def save(self):  # Atomic: a crash mid-write leaves the previous file in place.
+        with self._lock:
+            if not self._dirty:
+                return
+            data = self.filter.to_bytes()
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+        os.replace(temporary_path, self.path)
+
+    def stats(self):
+        with self._lock:
+            filters = self.filter.filters
+            return {
+                "recipes": len(self.filter),
+                "filters": len(filters),
+                "bytes": sum(len(bloom.bits) for bloom in filters),
+                "error_rate": sum(bloom.error_rate for bloom in filters),  # Upper bound on a false "already seen"
+            }
+
+    def close(self):
+        self.save()
@@ -0,0 +1,401 @@
+import io
+import os
+import ssl
+import gzip
+import json
+import asyncio
+import argparse
+import http.client
+from urllib.parse import urlsplit, urlencode
+import requests
+from spoonacular_client import (API_ROOT, BASE_URL, DETAILED_RECIPE_URL, BULK_RECIPE_URL, SEARCH_URL, MAX_RANDOM_RECIPES, MAX_BULK_IDS,
+                                MAX_SEARCH_RESULTS, TIMEOUTS, KEY_REJECTED_STATUSES)
+from api_key_pool import ApiKeyPool, parse_api_keys, QUOTA_LEFT_HEADER
+from retry_policy import RetryPolicy
+from spoonacular_errors import DeadlineExceeded, raise_for_status
+from circuit_breaker import CircuitOpenError
+from recipe_parser import missing_recipe_fields, RECIPE_PATHS
+from recipe_model import Recipe
+from intolerance_matcher import intolerance_bits
+from json_projection import compile_paths, project
+from recipe_export import make_fs_friendly, render_markdown, write_export
+
+DEFAULT_LIMIT = 20  # Requests on the wire at once. Any number of fetches can be awaiting; the rest queue for a slot.
+NO_BODY_STATUSES = {204, 304}
+RANDOM_PROJECTION = compile_paths([f"recipes[].{path}" for path in RECIPE_PATHS])  # The pipeline never keeps whole payloads,
+DETAIL_PROJECTION = compile_paths(RECIPE_PATHS)  # so it decodes only what it reads.
+
+
+class AsyncResponse:  # The parts of requests.Response the pipeline relies on, so callers handle both clients the same way.
+    def __init__(self, url, status_code, reason, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers  # http.client.HTTPMessage, so lookups are case-insensitive.
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):  # Raises the structured SpoonacularHTTPError subclass for the status.
+        return raise_for_status(self)
+
+
+class AsyncSpoonacularClient:  # asyncio counterpart of SpoonacularClient: stdlib HTTP/1.1 over keep-alive connections, one thread.
+    def __init__(self, api_key, limit=DEFAULT_LIMIT, timeouts=None, cache=None, api_root=API_ROOT, retry=None, breaker=None, hedge=None):
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker  # Optional CircuitBreaker and HedgePolicy, as in SpoonacularClient.
+        self.hedge = hedge
+        self.cache = cache  # Optional RecipeCache, shared with the sync client's DETAILED_RECIPE_URL entries.
+        self.api_root = api_root.rstrip("/")  # Swap in a StubServer url to test without the real API.
+        self.limit = limit  # Also the number of idle keep-alive connections kept per host, so a busy client never reconnects.
+        self.requests_sent = 0
+        self.connections_opened = 0
+        self._slots = asyncio.Semaphore(limit)
+        self._idle = {}  # (scheme, host, port) -> idle (reader, writer) pairs, most recently used last
+        self._ssl_context = None
+        self.set_api_key(api_key)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def set_api_key(self, api_key):  # Several keys ("key1,key2") get an ApiKeyPool, as in SpoonacularClient.
+        self.api_key = api_key
+        keys = parse_api_keys(api_key or "")
+        self.key_pool = ApiKeyPool(keys) if len(keys) > 1 else None
+        self._quota_left = None  # A single key's last X-API-Quota-Left; a pool tracks its own keys.
+
+    def quota_by_key(self, reserve=0.0):  # As ApiKeyPool.quota_by_key, for one key or many: today's points left per key, None if unknown.
+        if self.key_pool is not None:
+            return self.key_pool.quota_by_key(reserve)
+        return [None if self._quota_left is None else max(self._quota_left - reserve, 0.0)]
+
+    def _record_quota(self, response):
+        if response.status_code == 402:
+            self._quota_left = 0.0
+            return
+        try:
+            self._quota_left = float(response.headers[QUOTA_LEFT_HEADER])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    async def get(self, endpoint, url, params=None):  # Same retry and deadline handling as SpoonacularClient.get, waiting without blocking the loop.
+        timeout = self.timeouts.get(endpoint, self.timeouts["default"])
+        if url.startswith(API_ROOT):  # Endpoint constants are absolute; re-root them so the stand-in server can be targeted.
+            url = self.api_root + url[len(API_ROOT):]
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        hedged = self.hedge is not None and self.hedge.applies_to(endpoint)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        attempts = 0
+        while True:
+            attempts += 1
+            if self.breaker is not None and not self.breaker.allow():  # recipe_information has already looked in the cache.
+                raise CircuitOpenError(f"Spoonacular has been failing; not calling {url} for now.")
+            try:
+                attempt = self._hedged_attempt if hedged else self._attempt
+                response = await attempt(url, self.retry.attempt_timeout(timeout, loop.time() - started))
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self._record_health(False)
+                elapsed = loop.time() - started
+                delay = self.retry.next_delay(attempts, elapsed)
+                if delay is None:
+                    if elapsed >= self.retry.deadline:
+                        raise DeadlineExceeded(f"No response from {url} within {self.retry.deadline}s ({attempts} attempts)") from error
+                    raise
+            except BaseException:
+                self._record_health(None)
+                raise
+            else:
+                self._record_health(response.status_code < 500)
+                delay = self.retry.next_delay(attempts, loop.time() - started, response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    def _record_health(self, healthy):  # Feeds the circuit breaker. None: the attempt said nothing about upstream health.
+        if self.breaker is None:
+            return
+        if healthy is None:
+            self.breaker.release()
+        elif healthy:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    async def _hedged_attempt(self, url, timeout):  # One attempt, duplicated if the first copy is slower than the hedge delay.
+        first = asyncio.ensure_future(self._timed_attempt(url, timeout))
+        done, _ = await asyncio.wait([first], timeout=self.hedge.delay())
+        if done:
+            return first.result()
+        second = asyncio.ensure_future(self._timed_attempt(url, timeout))
+        pending = {first, second}
+        winner = None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in (first, second) if task in done and task.exception() is None), None)
+        for task in pending:
+            task.cancel()  # Frees its connection slot straight away.
+        for task in done:
+            task.exception()  # Marks a losing copy's error as seen.
+        if winner is None:
+            return first.result()  # Both copies failed; raise the first one's error.
+        self.hedge.record_hedge(won=winner is second)
+        return winner.result()
+
+    async def _timed_attempt(self, url, timeout):
+        started = asyncio.get_running_loop().time()
+        response = await self._attempt(url, timeout)
+        self.hedge.observe(asyncio.get_running_loop().time() - started)
+        return response
+
+    async def _attempt(self, url, timeout):  # One attempt. With a key pool, a rejected key is retried on the next one straight away.
+        if self.key_pool is None:
+            response = await self._send(url, timeout, self.api_key)
+            self._record_quota(response)
+            return response
+        while True:
+            key, wait = self.key_pool.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await self._send(url, timeout, key)
+            except BaseException:  # Cancellation included, so the key's in-flight count stays right.
+                self.key_pool.record(key)
+                raise
+            self.key_pool.record(key, response)
+            if response.status_code not in KEY_REJECTED_STATUSES or not self.key_pool.available():
+                return response
+
+    async def _send(self, url, timeout, api_key):  # Raises requests exceptions, like the sync client.
+        connect_timeout, read_timeout = timeout
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        async with self._slots:
+            for attempt in range(2):
+                connection, reused = await self._connection(key, connect_timeout)
+                try:
+                    response, keep_alive = await asyncio.wait_for(self._exchange(connection, parts, url, api_key), read_timeout)
+                except asyncio.TimeoutError:  # Checked first: since 3.11 it is also an OSError.
+                    connection[1].close()
+                    raise requests.exceptions.ReadTimeout(f"No response from {parts.hostname} within {read_timeout}s")
+                except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+                    connection[1].close()
+                    if reused and attempt == 0:  # The server dropped an idle keep-alive connection. Retry once on a fresh one.
+                        continue
+                    raise requests.exceptions.ConnectionError(f"{parts.hostname}: {error}") from error
+                except asyncio.CancelledError:  # E.g. the losing copy of a hedged request. The connection is mid-response, so drop it.
+                    connection[1].close()
+                    raise
+                self.requests_sent += 1
+                self._release(key, connection, keep_alive)
+                return response
+
+    async def _connection(self, key, timeout):  # Returns ((reader, writer), reused).
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        scheme, host, port = key
+        if scheme == "https" and self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=self._ssl_context if scheme == "https" else None), timeout)
+        except asyncio.TimeoutError:
+            raise requests.exceptions.ConnectTimeout(f"Could not connect to {host} within {timeout}s")
+        except OSError as error:
+            raise requests.exceptions.ConnectionError(f"{host}: {error}") from error
+        self.connections_opened += 1
+        return connection, False
+
+    def _release(self, key, connection, keep_alive):
+        idle = self._idle.setdefault(key, [])
+        if keep_alive and len(idle) < self.limit:
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def _exchange(self, connection, parts, url, api_key):  # One request/response on an open connection. Returns (response, keep_alive).
+        reader, writer = connection
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        writer.write(
+            f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nx-api-key: {api_key}\r\nContent-Type: application/json\r\n"
+            f"Accept: */*\r\nAccept-Encoding: gzip\r\nConnection: keep-alive\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before a response arrived")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        status = int(status)
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            header_lines.append(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines)))
+
+        keep_alive = version == "HTTP/1.1" and headers.get("Connection", "").lower() != "close"
+        if status in NO_BODY_STATUSES:
+            body = b""
+        elif headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):  # Skip trailers
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)  # CRLF after each chunk
+            body = b"".join(chunks)
+        elif "Content-Length" in headers:
+            body = await reader.readexactly(int(headers["Content-Length"]))
+        else:  # Body runs to the end of the connection.
+            body = await reader.read()
+            keep_alive = False
+        if headers.get("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return AsyncResponse(url, status, reason, headers, body), keep_alive
+
+    async def random_recipes(self, parameters):
+        parameters = dict(parameters)
+        parameters["number"] = max(1, min(int(parameters.get("number", 1)), MAX_RANDOM_RECIPES))
+        return await self.get("random", BASE_URL, params=parameters)
+
+    async def search_recipes(self, parameters):  # One page of /complexSearch results: ids and titles, `number` (at most 100) from `offset`.
+        parameters = dict(parameters)
+        parameters["number"] = max(1, min(int(parameters.get("number", 10)), MAX_SEARCH_RESULTS))
+        return await self.get("complexSearch", SEARCH_URL, params=parameters)
+
+    async def recipe_information(self, recipe_id):
+        url = DETAILED_RECIPE_URL.format(id=recipe_id)
+        if self.cache is not None:
+            body = self.cache.get(recipe_id)
+            if body is not None:
+                headers = http.client.HTTPMessage()
+                headers["Content-Type"] = "application/json"
+                headers["X-ReciPy-Cache"] = "hit"
+                return AsyncResponse(url, 200, "OK", headers, body)
+        response = await self.get("information", url)
+        if self.cache is not None and response.status_code == 200:
+            self.cache.set(recipe_id, response.content)
+        return response
+
+    async def recipe_information_bulk(self, recipe_ids, chunk_size=MAX_BULK_IDS):
+        # Same contract as SpoonacularClient.recipe_information_bulk. Chunks go out concurrently, bounded by the client's limit.
+        recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+        unique_ids = list(dict.fromkeys(recipe_ids))
+        by_id = {}
+        if self.cache is not None:
+            for recipe_id in unique_ids:
+                body = self.cache.get(recipe_id)
+                if body is not None:
+                    by_id[recipe_id] = json.loads(body)
+            unique_ids = [recipe_id for recipe_id in unique_ids if recipe_id not in by_id]
+        chunks = [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+
+        async def fetch_chunk(chunk):
+            response = await self.get("informationBulk", BULK_RECIPE_URL, params={"ids": ",".join(map(str, chunk))})
+            return raise_for_status(response).json()
+
+        for payloads in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+            for payload in payloads:
+                by_id[payload["id"]] = payload
+                if self.cache is not None:
+                    self.cache.set(payload["id"], json.dumps(payload).encode("utf-8"))
+        return [by_id.get(recipe_id) for recipe_id in recipe_ids]
+
+    def connection_stats(self):  # Same keys as SpoonacularClient.connection_stats.
+        return {
+            "requests": self.requests_sent,
+            "connections_opened": self.connections_opened,
+            "connections_reused": max(self.requests_sent - self.connections_opened, 0),
+        }
+
+    async def close(self):
+        writers = [writer for idle in self._idle.values() for _, writer in idle]
+        self._idle.clear()
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+# <<< Async pipeline: find_recipe -> Recipe -> save_to_file, for serving many users from one process >>>
+async def find_recipe(client, parameters):  # One random Recipe, or None. Only RECIPE_PATHS are decoded.
+    response = await client.random_recipes(dict(parameters, number=1))
+    response.raise_for_status()
+    recipes = project(response.content, RANDOM_PROJECTION)["recipes"]
+    if not recipes:
+        return None
+    recipe_info = recipes[0]
+    if missing_recipe_fields(recipe_info):
+        response = await client.recipe_information(recipe_info["id"])
+        response.raise_for_status()
+        recipe_info = project(response.content, DETAIL_PROJECTION)
+    recipe = Recipe.from_payload(recipe_info)
+    if not recipe.allows(intolerance_bits(parameters.get("intolerances") or "")):  # Spoonacular let through something the user can't eat.
+        return None
+    return recipe
+
+
+async def save_to_file(recipe, directory, parameters):  # Writes the markdown export off the event loop. Returns the path.
+    tags = (parameters.get("tags") or "").split(",")
+    exclusions = [exclusion for exclusion in (parameters.get("intolerances") or "").split(",") if exclusion]
+    text = render_markdown(recipe, "vegan" in tags, "vegetarian" in tags, exclusions)
+    return await asyncio.to_thread(write_export, directory, f"{make_fs_friendly(recipe.title)}-{recipe.id}.md", text)
+
+
+async def serve_recipe(client, parameters, directory):  # The whole pipeline for one user. Returns the saved path, or None if nothing matched.
+    recipe = await find_recipe(client, parameters)
+    if recipe is None:
+        return None
+    return await save_to_file(recipe, directory, parameters)
+
+
+async def serve_many(client, requests_parameters, directory):
+    # Runs serve_recipe for every parameters dict at once; the client's limit bounds what is actually on the wire.
+    # Results line up with the input; a failed fetch shows up as its exception rather than cancelling the others.
+    return await asyncio.gather(*(serve_recipe(client, parameters, directory) for parameters in requests_parameters), return_exceptions=True)
+
+
+async def main(argv=None):  # Load check: `python spoonacular_async.py --api-root http://127.0.0.1:8089 --count 500`, with spoonacular_stub.py running.
+    parser = argparse.ArgumentParser(description="Fetch and save many random recipes concurrently.")
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="requests on the wire at once")
+    parser.add_argument("--api-root", default=API_ROOT)
+    parser.add_argument("-o", "--output-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "ReciPy"))
+    args = parser.parse_args(argv)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with AsyncSpoonacularClient(os.environ.get("SPOONACULAR_API_KEY", ""), limit=args.limit, api_root=args.api_root) as client:
+        results = await serve_many(client, [{"tags": "", "intolerances": ""}] * args.count, args.output_dir)
+        stats = client.connection_stats()
+    failures = [result for result in results if isinstance(result, BaseException)]
+    print(f"{len(results) - len(failures)} saved, {len(failures)} failed in {loop.time() - started:.2f}s; {stats}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
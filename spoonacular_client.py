@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from recipe_cache import CachingAdapter
+from api_key_pool import ApiKeyPool, parse_api_keys
+from retry_policy import RetryPolicy
+from spoonacular_errors import DeadlineExceeded, raise_for_status
+from circuit_breaker import CircuitOpenError
+
+# <<< Spoonacular endpoints >>>
+API_ROOT = "https://api.spoonacular.com"
+BASE_URL = API_ROOT + "/recipes/random"  # base URL lifted from Spoonacular API guide
+DETAILED_RECIPE_URL = API_ROOT + "/recipes/{id}/information"  # Recipe endpoint from Spoonacular API guide
+BULK_RECIPE_URL = API_ROOT + "/recipes/informationBulk"  # Same payloads as DETAILED_RECIPE_URL, many ids per call
+SEARCH_URL = API_ROOT + "/recipes/complexSearch"  # Pages of search results; `offset` + `number` walk them
+
+MAX_RANDOM_RECIPES = 100  # Largest `number` /recipes/random accepts in one call.
+MAX_BULK_IDS = 100  # Ids sent per /informationBulk call.
+MAX_SEARCH_RESULTS = 100  # Largest `number` /complexSearch accepts in one call.
+MAX_SEARCH_OFFSET = 900  # /complexSearch won't page past this `offset`.
+DEFAULT_BULK_WORKERS = 4  # Bulk chunks in flight at once. Keep this at or below the pool size.
+
+KEY_REJECTED_STATUSES = {401, 402}  # Invalid key, out of quota. With a key pool, these retry on the next key.
+
+DEFAULT_POOL_SIZE = 10  # Keep-alive connections held open per host. Raise this if many threads share the client.
+
+TIMEOUTS = {  # (connect, read) timeouts in seconds, per endpoint
+    "random": (3.05, 10),
+    "information": (3.05, 10),
+    "informationBulk": (3.05, 30),
+    "complexSearch": (3.05, 15),
+    "default": (3.05, 15),
+}
+
+
+class SpoonacularClient:  # One persistent session (and connection pool) for every Spoonacular call.
+    def __init__(self, api_key, pool_size=DEFAULT_POOL_SIZE, timeouts=None, cache=None, retry=None, breaker=None, hedge=None):
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))  # Per-endpoint overrides on top of the defaults.
+        self.retry = retry or RetryPolicy()  # Retries for 429/5xx/connection errors, all within one per-request deadline.
+        self.breaker = breaker  # Optional CircuitBreaker: while open, requests fail fast (detail requests still get cache hits).
+        self.hedge = hedge  # Optional HedgePolicy: duplicates slow detail requests and keeps the first answer.
+        self._hedge_pool = None
+        self._pool_size = pool_size
+        self.cache = cache  # Optional RecipeCache in front of DETAILED_RECIPE_URL (and the same payloads from bulk calls).
+        self.session = requests.Session()
+        if cache is not None:
+            adapter = CachingAdapter(cache, pool_connections=pool_size, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Content-Type"] = "application/json"  # Default content type per Spoonacular API documentation
+        self.set_api_key(api_key)
+
+    def set_api_key(self, api_key):  # The key always travels in the x-api-key header. Several keys ("key1,key2") get an ApiKeyPool.
+        self.api_key = api_key
+        keys = parse_api_keys(api_key or "")
+        self.key_pool = ApiKeyPool(keys) if len(keys) > 1 else None
+        if self.key_pool is None:
+            self.session.headers["x-api-key"] = api_key
+        else:
+            self.session.headers.pop("x-api-key", None)  # Chosen per request instead.
+
+    def get(self, endpoint, url, params=None):  # `endpoint` picks the timeout from TIMEOUTS. Non-retryable responses are returned as they are.
+        timeout = self.timeouts.get(endpoint, self.timeouts["default"])
+        hedged = self.hedge is not None and self.hedge.applies_to(endpoint)
+        started = time.monotonic()
+        attempts = 0
+        while True:
+            attempts += 1
+            if self.breaker is not None and not self.breaker.allow():
+                response = self._cached_response(url, params)
+                if response is not None:
+                    return response
+                raise CircuitOpenError(f"Spoonacular has been failing; not calling {url} for now.")
+            elapsed = time.monotonic() - started
+            try:
+                send = self._hedged_send if hedged else self._send
+                response = send(url, params, self.retry.attempt_timeout(timeout, elapsed))
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self._record_health(False)
+                elapsed = time.monotonic() - started
+                delay = self.retry.next_delay(attempts, elapsed)
+                if delay is None:
+                    if elapsed >= self.retry.deadline:
+                        raise DeadlineExceeded(f"No response from {url} within {self.retry.deadline}s ({attempts} attempts)") from error
+                    raise
+            except BaseException:
+                self._record_health(None)
+                raise
+            else:
+                self._record_health(None if "X-ReciPy-Cache" in response.headers else response.status_code < 500)
+                delay = self.retry.next_delay(attempts, time.monotonic() - started, response)
+                if delay is None:
+                    return response
+                response.close()  # Hand the connection back to the pool before waiting.
+            time.sleep(delay)
+
+    def _record_health(self, healthy):  # Feeds the circuit breaker. None: the attempt said nothing about upstream health.
+        if self.breaker is None:
+            return
+        if healthy is None:
+            self.breaker.release()
+        elif healthy:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _cached_response(self, url, params):  # A fresh cache entry for a detail request, or None. Lets an open circuit still serve cached recipes.
+        adapter = self.session.get_adapter(url)
+        if not isinstance(adapter, CachingAdapter):
+            return None
+        return adapter.cached_response(self.session.prepare_request(requests.Request("GET", url, params=params)))
+
+    def _hedged_send(self, url, params, timeout):  # One attempt, duplicated if the first copy is slower than the hedge delay.
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix="recipy-hedge")
+        first = self._hedge_pool.submit(self._timed_send, url, params, timeout)
+        try:
+            return first.result(timeout=self.hedge.delay())
+        except FuturesTimeout:
+            pass
+        second = self._hedge_pool.submit(self._timed_send, url, params, timeout)
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = first if first in done else second
+        if winner.exception() is not None:  # That copy failed outright; the other one may still come good.
+            winner = second if winner is first else first
+            winner.exception()  # Waits for it.
+        loser = second if winner is first else first
+        loser.add_done_callback(lambda future: future.exception() is None and future.result().close())
+        self.hedge.record_hedge(won=winner is second)
+        return winner.result()  # Raises if both copies failed.
+
+    def _timed_send(self, url, params, timeout):
+        started = time.monotonic()
+        response = self._send(url, params, timeout)
+        if "X-ReciPy-Cache" not in response.headers:
+            self.hedge.observe(time.monotonic() - started)
+        return response
+
+    def _send(self, url, params, timeout):  # One attempt. With a key pool, a rejected key is retried on the next one straight away.
+        if self.key_pool is None:
+            return self.session.get(url, params=params, timeout=timeout)
+        while True:
+            key, wait = self.key_pool.reserve()  # Raises NoApiKeyAvailable once every key is out of rotation.
+            if wait:
+                time.sleep(wait)  # That key's token bucket is empty, and so are the others'.
+            try:
+                response = self.session.get(url, params=params, timeout=timeout, headers={"x-api-key": key})
+            except requests.RequestException:
+                self.key_pool.record(key)
+                raise
+            self.key_pool.record(key, response)
+            if response.status_code not in KEY_REJECTED_STATUSES or not self.key_pool.available():
+                return response
+
+    def random_recipes(self, parameters):  # One call returns up to MAX_RANDOM_RECIPES recipes, so batching costs a single round trip.
+        parameters = dict(parameters)
+        parameters["number"] = max(1, min(int(parameters.get("number", 1)), MAX_RANDOM_RECIPES))
+        return self.get("random", BASE_URL, params=parameters)
+
+    def recipe_information(self, recipe_id):
+        return self.get("information", DETAILED_RECIPE_URL.format(id=recipe_id))
+
+    def recipe_information_bulk(self, recipe_ids, chunk_size=MAX_BULK_IDS, max_workers=DEFAULT_BULK_WORKERS):
+        # Returns one payload per id, in the order given (None where the API returned nothing). Raises a SpoonacularError if a chunk fails.
+        recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+        unique_ids = list(dict.fromkeys(recipe_ids))  # Don't pay for the same id twice.
+        by_id = {}
+        if self.cache is not None:  # Bulk payloads are the same as /information ones, so they share the cache.
+            for recipe_id in unique_ids:
+                body = self.cache.get(recipe_id)
+                if body is not None:
+                    by_id[recipe_id] = json.loads(body)
+            unique_ids = [recipe_id for recipe_id in unique_ids if recipe_id not in by_id]
+        chunks = [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+
+        def fetch_chunk(chunk):
+            response = self.get("informationBulk", BULK_RECIPE_URL, params={"ids": ",".join(map(str, chunk))})
+            return raise_for_status(response).json()
+
+        if len(chunks) <= 1:
+            results = [fetch_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:  # Chunks share the session's keep-alive pool.
+                results = list(pool.map(fetch_chunk, chunks))
+
+        for payloads in results:
+            for payload in payloads:
+                by_id[payload["id"]] = payload
+                if self.cache is not None:
+                    self.cache.set(payload["id"], json.dumps(payload).encode("utf-8"))
+        return [by_id.get(recipe_id) for recipe_id in recipe_ids]
+
+    def connection_stats(self):  # Counters summed over every host pool the session currently holds.
+        requests_sent = 0
+        connections_opened = 0
+        adapters = {id(adapter): adapter for adapter in self.session.adapters.values()}  # The same adapter is mounted for http:// and https://.
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+                    connections_opened += pool.num_connections
+        return {
+            "requests": requests_sent,
+            "connections_opened": connections_opened,
+            "connections_reused": max(requests_sent - connections_opened, 0),
+        }
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client(api_key=None, pool_size=DEFAULT_POOL_SIZE, timeouts=None, cache=None, retry=None, breaker=None, hedge=None):  # Returns the shared per-process client, creating it on first use.
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():  # Sockets must not be shared with a forked child, so each process gets its own session.
+            _client = SpoonacularClient(api_key, pool_size=pool_size, timeouts=timeouts, cache=cache, retry=retry, breaker=breaker, hedge=hedge)
+            _client_pid = os.getpid()
+        elif api_key is not None and api_key != _client.api_key:
+            _client.set_api_key(api_key)
+        return _client
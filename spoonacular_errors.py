@@ -0,0 +1,66 @@
+from requests import RequestException, HTTPError, Timeout
+
+# <<< Structured errors for Spoonacular calls. All are RequestExceptions, so existing `except RequestException` handlers still catch them. >>>
+
+
+class SpoonacularError(RequestException):
+    pass
+
+
+class SpoonacularHTTPError(SpoonacularError, HTTPError):  # The API answered, but not with a 2xx.
+    @property
+    def status_code(self):
+        return self.response.status_code if self.response is not None else None
+
+
+class ClientError(SpoonacularHTTPError):  # 4xx not covered below, e.g. 404 for an unknown recipe id. Retrying won't help.
+    pass
+
+
+class AuthenticationError(ClientError):  # 401: missing or invalid API key
+    pass
+
+
+class QuotaExceededError(ClientError):  # 402: the key's daily points are spent. Resets at midnight UTC.
+    pass
+
+
+class RateLimitedError(SpoonacularHTTPError):  # 429: too many requests for the plan; Retry-After says when to come back.
+    pass
+
+
+class ServerError(SpoonacularHTTPError):  # 5xx
+    pass
+
+
+class DeadlineExceeded(SpoonacularError, Timeout):  # Retries ran out of time before a usable response arrived.
+    pass
+
+
+class NoApiKeyAvailable(SpoonacularError):  # Every key in the pool is invalid or out of quota until the next daily reset.
+    pass
+
+
+STATUS_ERRORS = {401: AuthenticationError, 402: QuotaExceededError, 429: RateLimitedError}
+
+
+def error_for_response(response):  # The matching error for a failed response, or None for a 2xx/3xx.
+    status = response.status_code
+    if status < 400:
+        return None
+    error_class = STATUS_ERRORS.get(status) or (ServerError if status >= 500 else ClientError)
+    try:
+        detail = response.json().get("message")  # Spoonacular explains most failures in a JSON body.
+    except (ValueError, AttributeError):
+        detail = None
+    message = f"{status} {response.reason or ''}".strip() + f" for url: {response.url}"
+    if detail:
+        message += f" ({detail})"
+    return error_class(message, response=response)
+
+
+def raise_for_status(response):  # Like Response.raise_for_status, with the structured error types.
+    error = error_for_response(response)
+    if error is not None:
+        raise error
+    return response
@@ -0,0 +1,158 @@
+import re
+import zlib
+import json
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qsl
+
+# <<< Local stand-in for the Spoonacular endpoints ReciPy calls. For load tests and offline development; never needs a real key. >>>
+# Point a client at it with api_root="http://127.0.0.1:<port>".
+DEFAULT_PORT = 8089
+DETAIL_PATH = re.compile(r"/recipes/(\d+)/information$")
+
+INGREDIENTS = [  # (Spoonacular ingredient id, name, aisle)
+    (1001, "butter", "Milk, Eggs, Other Dairy"), (1123, "egg", "Milk, Eggs, Other Dairy"), (20081, "flour", "Baking"),
+    (11215, "garlic", "Produce"), (16057, "chickpeas", "Canned and Jarred"), (15076, "salmon", "Seafood"),
+    (12061, "almonds", "Nuts"), (16124, "soy sauce", "Ethnic Foods"), (11282, "onion", "Produce"),
+    (20444, "rice", "Pasta and Rice"), (9152, "lemon juice", "Produce"), (4053, "olive oil", "Oil, Vinegar, Salad Dressing"),
+]
+STEPS = ["Preheat the oven to 180C", "Chop the {0}", "Mix the {0} with the {1}", "Simmer for 10 minutes", "Season to taste", "Serve warm"]
+
+
+def make_recipe(recipe_id, vegan=None, vegetarian=None):  # Deterministic per id, so repeat requests return the same payload.
+    rnd = random.Random(recipe_id)
+    picked = rnd.sample(INGREDIENTS, rnd.randint(3, 8))
+    vegan = rnd.random() < 0.2 if vegan is None else vegan
+    vegetarian = vegan or (rnd.random() < 0.4 if vegetarian is None else vegetarian)
+    steps = [step.format(picked[0][1], picked[-1][1]) for step in rnd.sample(STEPS, rnd.randint(2, 5))]
+    return {
+        "id": recipe_id,
+        "title": f"Stand-in Recipe {recipe_id}",
+        "vegan": vegan,
+        "vegetarian": vegetarian,
+        "glutenFree": not any(name == "flour" for _, name, _ in picked),
+        "dairyFree": not any(name == "butter" for _, name, _ in picked),
+        "readyInMinutes": rnd.randint(10, 120),
+        "pricePerServing": round(rnd.uniform(50, 900), 2),
+        "healthScore": rnd.randint(0, 100),
+        "servings": rnd.randint(1, 6),
+        "extendedIngredients": [
+            {"id": ingredient_id, "name": name, "nameClean": name, "aisle": aisle, "amount": float(amount), "unit": "cup",
+             "original": f"{amount} cup {name}"}
+            for amount, (ingredient_id, name, aisle) in enumerate(picked, 1)
+        ],
+        "instructions": "<ol>" + "".join(f"<li>{step}</li>" for step in steps) + "</ol>",
+        "analyzedInstructions": [{"name": "", "steps": [{"number": number, "step": step, "ingredients": [], "equipment": []}
+                                                        for number, step in enumerate(steps, 1)]}],
+    }
+
+
+def search_results(query, offset, number):  # (page of {"id", "title"}, total). Deterministic per query, like a real catalogue.
+    seed = zlib.crc32(query.encode("utf-8"))
+    total = 200 + seed % 700
+    ids = [1 + (seed + index * 7919) % 10 ** 6 for index in range(offset, min(offset + number, total))]
+    return [{"id": recipe_id, "title": f"Stand-in Recipe {recipe_id}"} for recipe_id in ids], total
+
+
+class StubServer:  # Minimal HTTP/1.1 keep-alive server for /recipes/random, /recipes/{id}/information, /recipes/informationBulk and /recipes/complexSearch.
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, latency=0.0, daily_quota=150.0):
+        self.host = host
+        self.port = port
+        self.latency = latency  # Seconds added to every response, to mimic the real API's round trip.
+        self.daily_quota = daily_quota  # Points per key, as on Spoonacular's free plan. Spent keys get 402.
+        self.quota_used = {}  # API key -> points charged
+        self.requests = 0
+        self._server = None
+
+    async def start(self):  # Port 0 picks a free port; self.port is updated to the real one.
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                api_key = ""
+                while True:  # Only the key matters among the headers.
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "x-api-key":
+                        api_key = value.strip()
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                used = self.quota_used.get(api_key, 0.0)
+                if used >= self.daily_quota:
+                    status, body, points = 402, {"status": "failure", "code": 402, "message": "Your daily points limit has been reached."}, 0
+                else:
+                    status, body, points = self.respond(method, target)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                self.requests += 1
+                used = self.quota_used[api_key] = used + points
+                data = json.dumps(body).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nX-API-Quota-Request: {points:g}\r\nX-API-Quota-Used: {used:g}\r\n"
+                    f"X-API-Quota-Left: {max(self.daily_quota - used, 0):g}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, method, target):  # Returns (status, body, quota points), charged roughly the way Spoonacular charges.
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        if method != "GET":
+            return 405, {"status": "failure", "message": "Method not allowed"}, 0
+        if url.path == "/recipes/random":
+            number = max(1, min(int(params.get("number", 1)), 100))
+            tags = params.get("tags", "").split(",")
+            vegan = True if "vegan" in tags else None
+            vegetarian = True if "vegetarian" in tags else None
+            recipes = [make_recipe(random.randint(1, 10 ** 6), vegan, vegetarian) for _ in range(number)]
+            return 200, {"recipes": recipes}, 1 + 0.01 * number
+        if url.path == "/recipes/informationBulk":
+            ids = [int(recipe_id) for recipe_id in params.get("ids", "").split(",") if recipe_id]
+            return 200, [make_recipe(recipe_id) for recipe_id in ids], 1 + 0.5 * max(len(ids) - 1, 0)
+        if url.path == "/recipes/complexSearch":
+            offset = int(params.get("offset", 0))
+            results, total = search_results(params.get("query", ""), offset, max(1, min(int(params.get("number", 10)), 100)))
+            return 200, {"results": results, "offset": offset, "number": len(results), "totalResults": total}, 1 + 0.01 * len(results)
+        match = DETAIL_PATH.search(url.path)
+        if match is not None:
+            return 200, make_recipe(int(match.group(1))), 1
+        return 404, {"status": "failure", "code": 404, "message": "Not found"}, 0
+
+
+async def serve(host, port, latency, daily_quota):
+    server = await StubServer(host, port, latency, daily_quota).start()
+    print(f"Spoonacular stand-in listening on {server.url}")
+    await server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Spoonacular recipe endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of simulated latency per response")
+    parser.add_argument("--daily-quota", type=float, default=150.0, help="quota points each API key may spend")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency, args.daily_quota))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,52 @@
+import os
+import time
+import tempfile
+import unittest
+from spoonacular_stub import StubServer
+from spoonacular_async import AsyncSpoonacularClient, serve_many
+
+# <<< AsyncSpoonacularClient against the local stand-in server. Run with `python -m unittest` (or pytest); no network or API key needed. >>>
+
+
+class AsyncClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await StubServer(port=0, daily_quota=10000.0).start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_keep_alive_reuses_one_connection(self):
+        async with AsyncSpoonacularClient("test-key", api_root=self.server.url) as client:
+            for recipe_id in range(1, 11):
+                response = await client.recipe_information(recipe_id)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["id"], recipe_id)
+            self.assertEqual(client.connection_stats(), {"requests": 10, "connections_opened": 1, "connections_reused": 9})
+        self.assertEqual(self.server.requests, 10)
+
+    async def test_bulk_results_follow_the_requested_order(self):
+        recipe_ids = [5, 3, 5, 42, 1]
+        async with AsyncSpoonacularClient("test-key", api_root=self.server.url) as client:
+            payloads = await client.recipe_information_bulk(recipe_ids, chunk_size=2)
+        self.assertEqual([payload["id"] for payload in payloads], recipe_ids)  # Repeats included
+        self.assertEqual(self.server.requests, 2)  # Four distinct ids in chunks of two
+
+    async def test_serve_many_stays_within_the_limit(self):
+        self.server.latency = 0.05
+        limit, count = 3, 12
+        with tempfile.TemporaryDirectory() as directory:
+            async with AsyncSpoonacularClient("test-key", limit=limit, api_root=self.server.url) as client:
+                started = time.perf_counter()
+                results = await serve_many(client, [{"tags": "", "intolerances": ""}] * count, directory)
+                elapsed = time.perf_counter() - started
+                stats = client.connection_stats()
+            self.assertEqual(len(results), count)
+            for path in results:
+                self.assertIsInstance(path, str)
+                self.assertTrue(os.path.exists(path))
+        self.assertLessEqual(stats["connections_opened"], limit)  # One connection per request on the wire
+        self.assertGreaterEqual(elapsed, (count / limit - 1) * self.server.latency)  # At most `limit` waited out the latency together
+
+
+if __name__ == "__main__":
+    unittest.main()